@@ -0,0 +1,29 @@
+import time
+import numpy as np
+from benchmarks.bench_step import PROBLEMS, EXPERIMENT, SEED, load_config
+from env.extended_states_generator import ExtendedStatesGenerator
+
+BATCH_SIZE = 10000
+
+
+def bench_generate(generator, batch_size):
+    """
+    Times the generation of batch_size instances one by one and with generate_states_batch
+    """
+    np.random.seed(SEED)
+    start = time.perf_counter()
+    for _ in range(batch_size):
+        generator.generate_states()
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    generator.generate_states_batch(batch_size)
+    batched = time.perf_counter() - start
+    return single, batched
+
+
+if __name__ == "__main__":
+    # Usage (from src): python -m benchmarks.bench_generate
+    for problem in PROBLEMS:
+        generator = ExtendedStatesGenerator(load_config("default.yaml", problem, EXPERIMENT))
+        single, batched = bench_generate(generator, BATCH_SIZE)
+        print(f"{problem}: {BATCH_SIZE / single:.0f} instances/s one by one, {BATCH_SIZE / batched:.0f} instances/s batched ({single / batched:.0f}x)")
@@ -0,0 +1,30 @@
+import time
+import numpy as np
+from env.init import initialize_environment
+
+NUM_STATES = 1000
+NUM_ROUNDS = 10
+
+
+def bench_reset(env):
+    """
+    Times CadesEnv.reset on pre-generated states, so that instance generation is not counted
+    """
+    states = [env.generate_states(training=True) for _ in range(NUM_STATES)]
+    # Warm up
+    for state in states:
+        env.reset(state)
+    timings = []
+    for _ in range(NUM_ROUNDS):
+        start = time.perf_counter()
+        for state in states:
+            env.reset(state)
+        timings.append((time.perf_counter() - start) / NUM_STATES)
+    return np.array(timings)
+
+
+if __name__ == "__main__":
+    # Usage (from src): python -m benchmarks.bench_reset --config utils/configs/problem_3.yaml utils/configs/experiment_trnc_c.yaml
+    env, config = initialize_environment()
+    timings = bench_reset(env)
+    print(f"Reset: {np.mean(timings) * 1e6:.2f} us (min {np.min(timings) * 1e6:.2f} us) over {NUM_STATES} states")
@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import numpy as np
+from utils.config import load_yaml_config, merge_configs, dict_to_namespace
+from env.cades_env import CadesEnv
+from utils.rng import GLOBAL_RNG
+
+CONFIGS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "utils", "configs")
+PROBLEMS = ["problem_1.yaml", "problem_2.yaml", "problem_3.yaml"]
+EXPERIMENT = "experiment_trnc_c.yaml"
+NUM_EPISODES = 2000
+SEED = 3
+# Configurations going through the numba kernels: dense communication matrix, communication edge list,
+# flat action space with the joint action masks, and invalid action replacement (training steps only)
+VARIANTS = {
+    "dense": {},
+    "edge_list": {"comm_edge_list": True},
+    "flat_masks": {"flat_action_space": True},
+    "replacement": {"invalid_action_replacement": True},
+}
+
+
+def load_config(*config_files, **overrides):
+    configs = [load_yaml_config(os.path.join(CONFIGS_DIR, config_file)) for config_file in config_files]
+    return dict_to_namespace(merge_configs(*configs, overrides))
+
+
+def run_episodes(env, states, seed, training=False):
+    """
+    Plays the given states with random (mostly valid) actions and returns
+    the trajectory of every step, the number of steps and the time spent in step and action_masks
+    """
+    rng = np.random.default_rng(seed)
+    # Random state of the invalid action replacement
+    GLOBAL_RNG.seed(seed)
+    trajectory = []
+    num_steps = 0
+    elapsed = 0
+    for state in states:
+        env.reset(state, training=False)
+        done = False
+        while not done:
+            tasks = env.current_state["tasks"]
+            valid_tasks = np.where(tasks > 0)[0]
+            task = rng.choice(valid_tasks) if rng.random() < 0.9 else rng.integers(len(tasks))
+            node = rng.integers(len(env.current_state["nodes"]))
+            if env.config.flat_action_space:
+                action = task * env.config.max_num_nodes + node
+            else:
+                action = np.array([task, node])
+            start = time.perf_counter()
+            masks = env.action_masks()
+            obs, reward, done, info = env.step(action, training=training)
+            elapsed += time.perf_counter() - start
+            num_steps += 1
+            trajectory.append((
+                reward,
+                done,
+                info["termination_cause"],
+                masks.tobytes(),
+                obs["tasks"].tobytes(),
+                obs["critical_mask"].tobytes(),
+                obs["nodes"].tobytes(),
+                obs["communications"].tobytes(),
+            ))
+    return trajectory, num_steps, elapsed
+
+
+if __name__ == "__main__":
+    # Usage (from src): python -m benchmarks.bench_step
+    # Exits with a non zero status if the python and numba backends play different episodes
+    mismatches = []
+    for problem in PROBLEMS:
+        for variant, overrides in VARIANTS.items():
+            training = overrides.get("invalid_action_replacement", False)
+            np.random.seed(SEED)
+            env = CadesEnv(load_config("default.yaml", problem, EXPERIMENT, fast_step=True, **overrides))
+            states = [env.generate_states(training=False) for _ in range(NUM_EPISODES)]
+            results = {}
+            for use_numba in (False, True):
+                env = CadesEnv(load_config("default.yaml", problem, EXPERIMENT, fast_step=True, use_numba=use_numba, **overrides))
+                # Warm up (and compile the kernels)
+                run_episodes(env, states[:10], SEED, training)
+                results[use_numba] = run_episodes(env, states, SEED, training)
+            parity = results[False][0] == results[True][0]
+            for use_numba, (_, num_steps, elapsed) in results.items():
+                backend = "numba" if use_numba else "python"
+                print(f"{problem} {variant} {backend}: {num_steps / elapsed:.0f} steps/s")
+            print(f"{problem} {variant} parity: {'identical' if parity else 'MISMATCH'}")
+            if not parity:
+                mismatches.append(f"{problem} {variant}")
+    if mismatches:
+        sys.exit(f"python and numba step kernels differ on: {', '.join(mismatches)}")
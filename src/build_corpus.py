@@ -0,0 +1,24 @@
+import random
+import numpy as np
+from utils.config import get_config
+from env.extended_states_generator import ExtendedStatesGenerator
+from env.instance_corpus import build_corpus
+
+if __name__ == "__main__":
+    # Usage: python build_corpus.py --config utils/configs/problem_3.yaml utils/configs/experiment_trnc_c.yaml --corpus_path corpora/problem_3_trnc_c --corpus_size 1000000
+    config = get_config()
+    if not config.corpus_path and not config.eval_corpus_path:
+        raise ValueError("corpus_path and/or eval_corpus_path argument should be provided")
+
+    random.seed(config.seed)
+    np.random.seed(config.seed)
+    generator = ExtendedStatesGenerator(config)
+
+    if config.corpus_path:
+        # Same generator as the training resets
+        build_corpus(generator, config, config.corpus_path, config.corpus_size, graph=config.use_comm_graph_in_train)
+        print(f"Wrote {config.corpus_size} training instances to {config.corpus_path}")
+    if config.eval_corpus_path:
+        # Evaluation always uses the communication graph
+        build_corpus(generator, config, config.eval_corpus_path, config.corpus_size, graph=True)
+        print(f"Wrote {config.corpus_size} evaluation instances to {config.eval_corpus_path}")
@@ -0,0 +1,119 @@
+import numpy as np
+
+
+class ActionMaskEngine:
+    """
+    Keeps the joint (task, node) validity mask of an episode. A pair is valid if the task is
+    not placed yet, fits in the remaining node capacity and, for critical tasks, no replica
+    is already placed in the node. Optionally, pairs that can not keep a communicating task
+    together with its senders/receivers are pruned as long as some other pair is left.
+    The mask is updated incrementally after every placement instead of being rebuilt.
+    """
+
+    def __init__(self, comm_pruning=False):
+        self.comm_pruning = comm_pruning
+
+    def reset(self, tasks, nodes, critical_mask, communications):
+        """
+        Builds the mask for the start of an episode. tasks and nodes are the arrays updated
+        in place by the environment, critical_mask holds the replica group ids.
+        """
+        self.tasks = tasks
+        self.nodes = nodes
+        self.replica_groups = np.asarray(critical_mask).astype(np.int64)
+        self.is_critical = self.replica_groups > 0
+        num_tasks = len(tasks)
+        num_nodes = len(nodes)
+        # whether a replica group is placed in a node (nodes x groups)
+        self.node_groups = np.zeros((num_nodes, self.replica_groups.max(initial=0) + 1), dtype=bool)
+        self.valid = (tasks[:, None] > 0) & (tasks[:, None] <= nodes[None, :])
+        if self.comm_pruning:
+            # partners of a task are its senders and receivers
+            comms = np.asarray(communications) > 0
+            self.partners = comms | comms.T
+            self.has_partners = self.partners.any(axis=1)
+            self.partners_cost = self.partners.astype(np.float64) @ tasks
+            # number of partners of a task placed in each node (tasks x nodes)
+            self.hosted_partners = np.zeros((num_tasks, num_nodes), dtype=np.int64)
+            self.comm_valid = self._comm_valid(slice(None), slice(None))
+
+    def _comm_valid(self, task_indices, node_indices):
+        """
+        A communicating task should go to a node which already hosts one of its partners,
+        or which has enough space left for the task and its unplaced partners
+        """
+        return (
+            ~self.has_partners[task_indices, None]
+            | (self.hosted_partners[task_indices][:, node_indices] > 0)
+            | (
+                self.nodes[None, node_indices]
+                >= (self.tasks[task_indices] + self.partners_cost[task_indices])[:, None]
+            )
+        )
+
+    def update(self, task_index, node_index):
+        """
+        Updates the mask after a task has been placed in a node.
+        Only the row of the task, the column of the node and (with pruning) the rows
+        of the task's partners change.
+        """
+        self.valid[task_index, :] = False
+        self.node_groups[node_index, self.replica_groups[task_index]] = True
+        # Node capacity and replicas changed only for the selected node
+        self.valid[:, node_index] = (
+            (self.tasks > 0)
+            & (self.tasks <= self.nodes[node_index])
+            & ~(self.is_critical & self.node_groups[node_index, self.replica_groups])
+        )
+        if self.comm_pruning:
+            partner_indices = np.where(self.partners[task_index])[0]
+            if len(partner_indices) > 0:
+                self.hosted_partners[partner_indices, node_index] += 1
+                # Recomputed rather than decremented to avoid accumulating rounding errors
+                self.partners_cost[partner_indices] = self.partners[partner_indices] @ self.tasks
+            self.comm_valid[:, node_index] = self._comm_valid(slice(None), [node_index])[:, 0]
+            if len(partner_indices) > 0:
+                self.comm_valid[partner_indices] = self._comm_valid(partner_indices, slice(None))
+
+    def snapshot(self):
+        """
+        Returns a copy of the mask state. Arrays which are not modified after reset are shared.
+        """
+        state = {"valid": self.valid.copy(), "node_groups": self.node_groups.copy(), "replica_groups": self.replica_groups, "is_critical": self.is_critical}
+        if self.comm_pruning:
+            state.update({
+                "partners": self.partners,
+                "has_partners": self.has_partners,
+                "partners_cost": self.partners_cost.copy(),
+                "hosted_partners": self.hosted_partners.copy(),
+                "comm_valid": self.comm_valid.copy(),
+            })
+        for array in state.values():
+            array.flags.writeable = False
+        return state
+
+    def restore(self, snapshot, tasks, nodes):
+        """
+        Restores a mask state returned by snapshot, tasks and nodes are the environment arrays
+        """
+        self.tasks = tasks
+        self.nodes = nodes
+        for name, array in snapshot.items():
+            # Arrays modified by update are copied back, the others are shared
+            if name in ("replica_groups", "is_critical", "partners", "has_partners"):
+                setattr(self, name, array)
+            else:
+                setattr(self, name, array.copy())
+
+    def mask(self):
+        """
+        Returns the (tasks x nodes) boolean mask of valid pairs
+        """
+        if self.comm_pruning:
+            pruned = self.valid & self.comm_valid
+            if pruned.any():
+                return pruned
+        if not self.valid.any():
+            # No valid pair is left, allow every remaining task so that the episode can terminate
+            return np.repeat((self.tasks > 0)[:, None], len(self.nodes), axis=1)
+        return self.valid
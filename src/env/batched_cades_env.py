@@ -0,0 +1,400 @@
+import numpy as np
+from gym import spaces
+from stable_baselines3.common.vec_env import VecEnv
+from utils.eval_metrics import (
+    get_avg_node_occupancy,
+    get_avg_active_node_occupancy,
+    get_empty_nodes_percentage,
+    get_evaluate_message_channel_occupancy
+)
+from env.cades_env import TerminationCause
+from env.extended_states_generator import ExtendedStatesGenerator
+from env.feasibility import FEASIBILITY_STATS
+from utils.rng import StreamRNG
+
+
+class BatchedCadesEnv(VecEnv):
+    """
+    Vectorized version of CadesEnv which keeps a batch of instances as stacked arrays
+    and applies a whole batch of [task, node] actions at once in the same process.
+    Rewards and termination rules are the same as in CadesEnv. Attributes are shared by the
+    whole batch, except the feasibility stats which are kept per row like in the CadesEnv of
+    a SharedMemoryVecEnv worker.
+    """
+
+    def __init__(self, config, num_envs, training=True):
+        self.config = config
+        if config.comm_edge_list:
+            raise ValueError("BatchedCadesEnv only supports the dense communication matrix, disable comm_edge_list")
+        if config.flat_action_space:
+            raise ValueError("BatchedCadesEnv only supports [task, node] actions, disable flat_action_space")
+        if config.corpus_path:
+            raise ValueError("BatchedCadesEnv generates its instances, corpus_path is not supported")
+        self.training = training
+        self.states_generator = ExtendedStatesGenerator(config)
+
+        max_tasks = config.max_num_tasks
+        max_nodes = config.max_num_nodes
+
+        action_space = spaces.MultiDiscrete([max_tasks, max_nodes])
+        observation_space = spaces.Dict(
+            {
+                "tasks": spaces.Box(
+                    low=0, high=1, shape=(max_tasks,), dtype=np.float64
+                ),
+                "critical_mask": spaces.Box(
+                    low=0, high=1, shape=(max_tasks,), dtype=np.float64
+                ),
+                "nodes": spaces.Box(
+                    low=0, high=1, shape=(max_nodes,), dtype=np.float64
+                ),
+                "communications": spaces.Box(
+                    low=0,
+                    high=1,
+                    shape=(max_tasks, max_tasks),
+                    dtype=np.uint8,
+                ),
+            }
+        )
+        super().__init__(num_envs, observation_space, action_space)
+
+        # Observation arrays (normalized), one row per instance
+        self.tasks = np.zeros((num_envs, max_tasks))
+        self.critical_mask = np.zeros((num_envs, max_tasks))
+        self.nodes = np.zeros((num_envs, max_nodes))
+        self.communications = np.zeros((num_envs, max_tasks, max_tasks), dtype=np.uint8)
+        # Initial node capacities and raw replica group ids (0 means non critical)
+        self.initial_nodes = np.zeros((num_envs, max_nodes))
+        self.replica_groups = np.zeros((num_envs, max_tasks))
+        # Node index of each task, -1 if the task is not placed yet
+        self.placement = np.full((num_envs, max_tasks), -1, dtype=np.int64)
+        # Per instance stats
+        self.norm_factor = np.ones(num_envs)
+        self.num_nodes = np.zeros(num_envs, dtype=np.int64)
+        self.tasks_len = np.zeros(num_envs, dtype=np.int64)
+        self.comms_len = np.zeros(num_envs, dtype=np.int64)
+        self.intranode_comms_len = np.zeros(num_envs, dtype=np.int64)
+        self.episode_len = np.zeros(num_envs, dtype=np.int64)
+        self.total_reward = np.zeros(num_envs)
+        self.reward_unit = np.ones(num_envs)
+        self.ep_len_norm_factor = np.ones(num_envs)
+
+        self._actions = None
+        self._rows = np.arange(num_envs)
+        # Feasibility stats of the generated instances per row and training flag, a batch of
+        # instances is counted in the row whose reset generated it
+        self.feasibility_stats = [
+            {flag: dict.fromkeys(FEASIBILITY_STATS, 0) for flag in (True, False)} for _ in range(num_envs)
+        ]
+        # Instances are generated num_envs at a time and consumed by the resets
+        self._generated_states = None
+        self._generated_idx = 0
+        self._init_rngs(config.seed)
+
+    def _init_rngs(self, seed):
+        # With rng_streams, every row is a worker with its own counter-based stream
+        if self.config.rng_streams:
+            self.rngs = [StreamRNG(seed, worker_id) for worker_id in range(self.num_envs)]
+        else:
+            self.rngs = None
+        self.row_episode = np.zeros(self.num_envs, dtype=np.int64)
+
+    def _next_states(self, env_idx):
+        """
+        Returns the next generated instance for the given row
+        """
+        # Use graph during evaluation and also in training if specified
+        use_graph = (not self.training) or self.config.use_comm_graph_in_train
+        if self.rngs is not None:
+            # Instances come from the stream of the row's episode, so they are generated one by one
+            self.row_episode[env_idx] += 1
+            rng = self.rngs[env_idx]
+            rng.set_stream(0, self.row_episode[env_idx], self.training)
+            self.states_generator.rng = rng
+            return self._count_feasibility_stats(env_idx, self.states_generator.generate_states(graph=use_graph))
+        if use_graph:
+            # The graph generator is sequential, nothing to gain from batching
+            return self._count_feasibility_stats(env_idx, self.states_generator.generate_states(graph=True))
+        if self._generated_states is None or self._generated_idx == self.num_envs:
+            # Feasibility stats are the totals of the batch, not a per instance column
+            self._generated_states = self._count_feasibility_stats(
+                env_idx, self.states_generator.generate_states_batch(self.num_envs)
+            )
+            self._generated_idx = 0
+        states = {key: value[self._generated_idx] for key, value in self._generated_states.items()}
+        self._generated_idx += 1
+        return states
+
+    def _count_feasibility_stats(self, env_idx, states):
+        stats = states.pop("feasibility_stats", None)
+        if stats is not None:
+            for key, value in stats.items():
+                self.feasibility_stats[env_idx][self.training][key] += value
+        return states
+
+    def _reset_env(self, env_idx, states=None):
+        """
+        Loads a new instance in the given row of the batch
+        """
+        if states is None:
+            states = self._next_states(env_idx)
+        # norm factor is the largest node size
+        norm_factor = np.max(states["nodes"])
+        # critical norm factor is the largest mask value in critical mask
+        critical_norm_factor = np.max(states["critical_mask"]) or 1
+        self.tasks[env_idx] = states["tasks"] / norm_factor
+        self.critical_mask[env_idx] = states["critical_mask"] / critical_norm_factor
+        self.nodes[env_idx] = states["nodes"] / norm_factor
+        self.initial_nodes[env_idx] = self.nodes[env_idx]
+        self.communications[env_idx] = states["communications"]
+        self.replica_groups[env_idx] = states["critical_mask"]
+        self.placement[env_idx] = -1
+        self.norm_factor[env_idx] = norm_factor
+        self.num_nodes[env_idx] = states["num_nodes"]
+        self.tasks_len[env_idx] = states["num_tasks"]
+        self.comms_len[env_idx] = states["num_communications"]
+        self.intranode_comms_len[env_idx] = 0
+        self.episode_len[env_idx] = 0
+        self.total_reward[env_idx] = 0
+        # Same factors as CadesEnv._reward_unit and CadesEnv._episode_length_norm_factor
+        Lmax = self.config.max_num_tasks
+        Lcurrent = states["num_tasks"]
+        self.reward_unit[env_idx] = Lmax / Lcurrent
+        self.ep_len_norm_factor[env_idx] = (Lmax * (Lmax + 1)) / (Lcurrent * (Lcurrent + 1))
+
+    def _get_obs(self, env_indices=None):
+        if env_indices is None:
+            env_indices = self._rows
+        return {
+            "tasks": self.tasks[env_indices].copy(),
+            "critical_mask": self.critical_mask[env_indices].copy(),
+            "nodes": self.nodes[env_indices].copy(),
+            "communications": self.communications[env_indices].copy(),
+        }
+
+    def _get_random_valid_tasks(self, env_indices):
+        """
+        Returns a random valid task index for each of the given rows
+        """
+        valid = self.tasks[env_indices] > 0
+        # Random scores on valid tasks only, argmax picks one of them uniformly
+        if self.rngs is not None:
+            scores = np.stack([self.rngs[env_idx].random(valid.shape[1]) for env_idx in env_indices])
+        else:
+            scores = np.random.random_sample(valid.shape)
+        scores[~valid] = -1
+        return np.argmax(scores, axis=1)
+
+    def _exponential_decay_reward(self, step, max_steps, max_reward, k=2):
+        return max_reward * (1 - (step / max_steps) ** k)
+
+    def _apply_actions(self, task_idx, node_idx):
+        """
+        Applies a batch of actions and returns rewards, dones and termination causes
+        """
+        rows = self._rows
+        cost = self.tasks[rows, task_idx]
+        ep_len = self.episode_len.astype(np.float64)
+        rewards = np.zeros(self.num_envs)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        causes = np.full(self.num_envs, None, dtype=object)
+
+        # Agent picked the task which is already used
+        duplicate = cost == 0
+        rewards[duplicate] = self._exponential_decay_reward(
+            ep_len[duplicate],
+            self.tasks_len[duplicate],
+            self.config.DUPLICATE_PICK_reward,
+        )
+        if self.training and self.config.invalid_action_replacement is True and duplicate.any():
+            # Select any other valid action, reward of the replacement is not counted
+            task_idx = task_idx.copy()
+            task_idx[duplicate] = self._get_random_valid_tasks(rows[duplicate])
+            cost = self.tasks[rows, task_idx]
+            replaced = duplicate
+        else:
+            dones[duplicate] = True
+            causes[duplicate] = str(TerminationCause.DUPLICATE_PICK)
+            replaced = np.zeros(self.num_envs, dtype=bool)
+        pending = ~duplicate | replaced
+
+        # Agent picked the node which is already full
+        overflow = pending & (cost > self.nodes[rows, node_idx])
+        rewards[overflow & ~replaced] = (
+            self.config.NODE_OVERFLOW_reward
+            * (ep_len * self.ep_len_norm_factor)
+            * 0.25
+        )[overflow & ~replaced]
+        dones[overflow] = True
+        causes[overflow] = str(TerminationCause.NODE_OVERFLOW)
+        pending &= ~overflow
+
+        # Agent picked the node which already had critical task
+        groups = self.replica_groups[rows, task_idx]
+        is_critical = self.critical_mask[rows, task_idx] > 0
+        duplicated = (
+            (self.placement == node_idx[:, None])
+            & (self.replica_groups == groups[:, None])
+        ).any(axis=1)
+        critical_duplicate = pending & is_critical & duplicated
+        rewards[critical_duplicate & ~replaced] = (
+            self.config.DUPLICATE_CRITICAL_PICK_reward
+            * (ep_len * self.ep_len_norm_factor)
+            * 0.15
+        )[critical_duplicate & ~replaced]
+        dones[critical_duplicate] = True
+        causes[critical_duplicate] = str(TerminationCause.DUPLICATE_CRITICAL_PICK)
+        pending &= ~critical_duplicate
+
+        # Agent picked the correct task and node
+        valid = pending
+        if valid.any():
+            v_rows = rows[valid]
+            v_tasks = task_idx[valid]
+            v_nodes = node_idx[valid]
+            valid_rewards = self.config.STEP_reward * self.reward_unit[valid]
+            valid_rewards = valid_rewards + (
+                (self.config.BONUS_reward * self.reward_unit[valid])
+                * (ep_len[valid] * self.ep_len_norm_factor[valid])
+            )
+            valid_rewards = valid_rewards + np.where(is_critical[valid], self.config.CRITICAL_reward, 0)
+            # Communicating tasks which are already placed in the selected node
+            in_node = self.placement[valid] == v_nodes[:, None]
+            allocated_receivers = (self.communications[v_rows, v_tasks, :] == 1) & in_node
+            allocated_senders = (self.communications[v_rows, :, v_tasks] == 1) & in_node
+            num_allocated = allocated_receivers.sum(axis=1) + allocated_senders.sum(axis=1)
+            comm_rewards = np.zeros(len(v_rows))
+            has_comms = num_allocated > 0
+            comm_rewards[has_comms] = (
+                self.config.COMM_reward / self.comms_len[valid][has_comms]
+            ) * num_allocated[has_comms]
+            valid_rewards = valid_rewards + comm_rewards
+            # Set the communication mask of the fulfilled pairs to zero
+            receivers_rows, receivers = np.nonzero(allocated_receivers)
+            self.communications[v_rows[receivers_rows], v_tasks[receivers_rows], receivers] = 0
+            senders_rows, senders = np.nonzero(allocated_senders)
+            self.communications[v_rows[senders_rows], senders, v_tasks[senders_rows]] = 0
+            self.intranode_comms_len[v_rows] += num_allocated
+            # Update states
+            self.critical_mask[v_rows, v_tasks] = 0
+            self.tasks[v_rows, v_tasks] = 0
+            self.nodes[v_rows, v_nodes] -= cost[valid]
+            self.placement[v_rows, v_tasks] = v_nodes
+            self.episode_len[v_rows] += 1
+            # Check if no task is remaining
+            success = ~(self.tasks[v_rows] > 0).any(axis=1)
+            valid_rewards[success] += self.config.SUCCESS_reward
+            dones[v_rows[success]] = True
+            causes[v_rows[success]] = str(TerminationCause.SUCCESS)
+            # Rewards of replaced actions are not counted
+            keep = ~replaced[valid]
+            rewards[v_rows[keep]] = valid_rewards[keep]
+
+        return rewards, dones, causes
+
+    def get_assignment_status(self, env_idx):
+        """
+        Builds the list of tasks placed in each node for the given row
+        """
+        assignment_status = [[] for _ in range(self.num_nodes[env_idx])]
+        placement = self.placement[env_idx]
+        # Tasks are appended in the order they were placed in CadesEnv, here they are sorted by index
+        for task_idx in np.where(placement >= 0)[0]:
+            assignment_status[placement[task_idx]].append(task_idx)
+        return assignment_status
+
+    def _episode_info(self, env_idx, cause):
+        """
+        Builds the info dict of a finished episode
+        """
+        norm_factor = self.norm_factor[env_idx]
+        total_capacities = self.initial_nodes[env_idx] * norm_factor
+        current_capacities = self.nodes[env_idx] * norm_factor
+        assignment_status = self.get_assignment_status(env_idx)
+        return {
+            "is_success": cause == str(TerminationCause.SUCCESS),
+            "episode_len": int(self.episode_len[env_idx]),
+            "termination_cause": cause,
+            "total_reward": self.total_reward[env_idx],
+            "assignment_status": assignment_status,
+            "avg_node_occupancy": get_avg_node_occupancy(total_capacities, current_capacities),
+            "avg_active_node_occupancy": get_avg_active_node_occupancy(total_capacities, current_capacities),
+            "message_channel_occupancy": get_evaluate_message_channel_occupancy(
+                self.comms_len[env_idx], self.intranode_comms_len[env_idx]
+            ),
+            "empty_nodes": get_empty_nodes_percentage(assignment_status),
+        }
+
+    def reset(self):
+        for env_idx in range(self.num_envs):
+            self._reset_env(env_idx)
+        return self._get_obs()
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs, 2)
+
+    def step_wait(self):
+        rewards, dones, causes = self._apply_actions(self._actions[:, 0], self._actions[:, 1])
+        self.total_reward += rewards
+        infos = [{"episode_len": int(ep_len)} for ep_len in self.episode_len]
+        done_indices = np.where(dones)[0]
+        if len(done_indices) > 0:
+            terminal_obs = self._get_obs(done_indices)
+            for i, env_idx in enumerate(done_indices):
+                infos[env_idx] = self._episode_info(env_idx, causes[env_idx])
+                infos[env_idx]["terminal_observation"] = {
+                    key: value[i] for key, value in terminal_obs.items()
+                }
+                # Auto reset the finished instance
+                self._reset_env(env_idx)
+        return self._get_obs(), rewards, dones, infos
+
+    def action_masks(self):
+        """
+        Returns the action masks of all instances, same rules as CadesEnv.action_masks
+        """
+        mask_tasks = self.tasks > 0
+        lowest_cost_tasks = np.argmin(self.tasks, axis=1)
+        lowest_costs = self.tasks[self._rows, lowest_cost_tasks]
+        mask_nodes = self.nodes >= lowest_costs[:, None]
+        return np.concatenate([mask_tasks, mask_nodes], axis=1)
+
+    def close(self):
+        pass
+
+    def seed(self, seed=None):
+        np.random.seed(seed)
+        # Drop the instances generated with the previous seed
+        self._generated_states = None
+        self._init_rngs(self.config.seed if seed is None else seed)
+        return [seed] * self.num_envs
+
+    def _get_indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
+
+    def get_attr(self, attr_name, indices=None):
+        if attr_name == "feasibility_stats":
+            return [self.feasibility_stats[i] for i in self._get_indices(indices)]
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        # The instances share their attributes, they can not be set for some of them only
+        if sorted(self._get_indices(indices)) != list(range(self.num_envs)):
+            raise ValueError(f"BatchedCadesEnv attributes are shared by all instances, can not set '{attr_name}' for indices {indices}")
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        indices = self._get_indices(indices)
+        # Action masks are requested per instance by sb3-contrib
+        if method_name == "action_masks":
+            masks = self.action_masks()
+            return [masks[i] for i in indices]
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs) for _ in indices]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
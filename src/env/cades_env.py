@@ -1,8 +1,9 @@
 import gym
-import random
 import numpy as np
 from gym import spaces
 from enum import Enum
+from types import MappingProxyType
+from typing import NamedTuple
 from utils.eval_metrics import (
     get_avg_node_occupancy,
     get_avg_active_node_occupancy,
@@ -10,7 +11,13 @@ from utils.eval_metrics import (
     get_evaluate_message_channel_occupancy
 )
 from env.extended_states_generator import ExtendedStatesGenerator
-import copy
+from env.comm_graph import edge_list_to_matrix
+from env.placement_state import PlacementState
+from env.action_mask import ActionMaskEngine
+from env.instance_prefetcher import InstancePrefetcher
+from env.instance_corpus import InstanceCorpus
+from env.feasibility import FEASIBILITY_STATS
+from utils.rng import GLOBAL_RNG, StreamRNG
 
 
 class TerminationCause(Enum):
@@ -26,12 +33,39 @@ class TerminationCause(Enum):
     def __str__(self):
         return self.description
 
+class EnvSnapshot(NamedTuple):
+    """
+    Immutable copy of the complete state of a CadesEnv episode, created by CadesEnv.snapshot
+    """
+    current_state: MappingProxyType
+    initial_state: MappingProxyType
+    placement: tuple
+    action_mask: MappingProxyType
+    communication_status: frozenset
+    info: MappingProxyType
+    env_stats: MappingProxyType
+    norm_factors: tuple
+    rng_state: object
+
+
+def _frozen_copy(observation):
+    """
+    Copies an observation dict into read-only arrays
+    """
+    frozen = {}
+    for key, value in observation.items():
+        value = value.copy()
+        value.flags.writeable = False
+        frozen[key] = value
+    return MappingProxyType(frozen)
+
+
 class CadesEnv(gym.Env):
     """Custom Environment that follows gym interface."""
 
     metadata = {"render.modes": ["human"]}
 
-    def __init__(self, config):
+    def __init__(self, config, worker_id=0):
         """
         Initializes observation and action spaces
         """
@@ -39,13 +73,112 @@ class CadesEnv(gym.Env):
 
         self.config = config
         self.states_generator = ExtendedStatesGenerator(config)
+        # Random source of the environment and its generator, either the global random state
+        # reseeded by SeedUpdateCallback or a counter-based stream of this worker
+        self.worker_id = worker_id
+        self.rng = StreamRNG(config.seed, worker_id) if config.rng_streams else GLOBAL_RNG
+        self.states_generator.rng = self.rng
         self.norm_factor = None
+        # In fast step mode, the reward trace is not built and metrics are only calculated at the end of episode
+        self.trace_rewards = not config.fast_step
+        if config.use_numba:
+            # numba is an optional dependency, only needed for the compiled step and mask kernels
+            try:
+                from env import jit_kernels
+            except ImportError as e:
+                raise ImportError("numba is required when use_numba is enabled (pip install numba)") from e
+            self.jit_kernels = jit_kernels
+        else:
+            self.jit_kernels = None
+        # fulfilled (sender, receiver) pairs written by the compiled kernel
+        self._comm_pairs = np.zeros((2 * config.max_num_tasks, 2), dtype=np.int64)
+        # Instances of the upcoming episodes are generated in worker processes if enabled
+        if config.prefetch_workers > 0:
+            self.instance_prefetcher = InstancePrefetcher(config, config.prefetch_workers, config.prefetch_size)
+        else:
+            self.instance_prefetcher = None
+        # Feasibility stats of the generated instances of the training and of the evaluation episodes,
+        # including the instances generated by the prefetcher workers
+        self.feasibility_stats = {training: dict.fromkeys(FEASIBILITY_STATS, 0) for training in (True, False)}
+
+        self.action_space = self._action_space(config)
+        if config.flat_action_space:
+            # Joint validity mask of the (task, node) pairs of the flat action space
+            self.action_mask_engine = ActionMaskEngine(comm_pruning=config.mask_comm_pruning)
+        else:
+            self.action_mask_engine = None
+
+        self.observation_space = self._observation_space(config)
+
+        self.env_stats = {}        
+        self.current_state = {}
+        # Buffers are allocated once and reused by every reset. Observations alternate between
+        # two buffers so that the final observation of an episode stays intact after the next reset
+        self._observation_buffers = [self._allocate_observation() for _ in range(2)]
+        self._observation_buffer_idx = 0
+        self.initial_state = self._allocate_observation()
+        self._frozen_initial_state = None
+        # placement stores the node index of every task and the replica groups present in each node
+        self.placement = PlacementState(
+            config.max_num_tasks, config.max_num_nodes, config.number_of_critical_tasks
+        )
+        # Pre-generated instances are streamed from disk instead of being generated, per training flag
+        self.corpora = {}
+        self.corpus_streams = {}
+        for training, corpus_path in ((True, config.corpus_path), (False, config.eval_corpus_path)):
+            if corpus_path:
+                self.corpora[training] = InstanceCorpus(corpus_path)
+                self.corpora[training].check_shapes(self.observation_space)
+                self.reset_corpus_stream(training)
+
+    def episode_key(self, epoch, episode, training=True):
+        """
+        Identifies the random stream of an episode of this worker (rng_streams only)
+        """
+        return (self.config.seed, self.worker_id, epoch, episode, training)
+
+    def seed_episode(self, epoch, episode, training=True):
+        """
+        Moves the random stream to the start of the given episode (rng_streams only)
+        and returns its key
+        """
+        self.rng.set_stream(epoch, episode, training)
+        return self.episode_key(epoch, episode, training)
 
-        self.action_space = spaces.MultiDiscrete(
+    def reset_corpus_stream(self, training=True):
+        """
+        Restarts the stream of corpus instances. Training instances are shuffled with the config seed and
+        the worker id, so that the workers of a SharedMemoryVecEnv play different instances. Evaluation
+        instances are read in order so that every evaluation runs the same instances.
+        """
+        if training not in self.corpora:
+            return
+        if training:
+            self.corpus_streams[training] = self.corpora[training].stream(
+                shuffle=True, chunk_size=self.config.corpus_chunk_size, seed=(self.config.seed, self.worker_id)
+            )
+        else:
+            self.corpus_streams[training] = self.corpora[training].stream(shuffle=False)
+
+    @staticmethod
+    def _action_space(config):
+        if config.flat_action_space:
+            # One action per (task, node) pair, masked with the joint validity mask
+            return spaces.Discrete(config.max_num_tasks * config.max_num_nodes)
+        return spaces.MultiDiscrete(
             [config.max_num_tasks, config.max_num_nodes]
         )
 
-        self.observation_space = spaces.Dict(
+    @staticmethod
+    def _action_mask_size(config):
+        # Joint mask of the flat action space, task mask followed by node mask otherwise
+        if config.flat_action_space:
+            return config.max_num_tasks * config.max_num_nodes
+        return config.max_num_tasks + config.max_num_nodes
+
+    @staticmethod
+    def _observation_space(config):
+        return spaces.Dict(
             {
                 "tasks": spaces.Box(
                     low=0, high=1, shape=(config.max_num_tasks,), dtype=np.float
@@ -56,17 +189,39 @@ class CadesEnv(gym.Env):
                 "nodes": spaces.Box(
                     low=0, high=1, shape=(config.max_num_nodes,), dtype=np.float
                 ),
-                "communications": spaces.Box(
-                    low=0,
-                    high=1,
-                    shape=(config.max_num_tasks, config.max_num_tasks),
-                    dtype=np.uint8,
-                ),
+                "communications": CadesEnv._communications_space(config),
             }
         )
 
-        self.env_stats = {}        
-        self.current_state = {}
+    @staticmethod
+    def _communications_space(config):
+        if config.comm_edge_list:
+            # Padded list of (sender, receiver) pairs, -1 marks padding and fulfilled communications
+            return spaces.Box(
+                low=-1,
+                high=config.max_num_tasks - 1,
+                shape=(max(config.max_num_comms, 1), 2),
+                dtype=np.int32,
+            )
+        return spaces.Box(
+            low=0,
+            high=1,
+            shape=(config.max_num_tasks, config.max_num_tasks),
+            dtype=np.uint8,
+        )
+
+    def _allocate_observation(self):
+        return {
+            key: np.zeros(space.shape, dtype=space.dtype)
+            for key, space in self.observation_space.spaces.items()
+        }
+
+    @property
+    def assignment_status(self):
+        """
+        List of tasks placed in each node, derived lazily from the placement state
+        """
+        return self.placement.assignment_status
 
     def _is_task_critical(self, task_index):
         """
@@ -78,18 +233,15 @@ class CadesEnv(gym.Env):
         """
         Checks if a critical task has any of its replicas in a node
         """
-        critical_mask = self.initial_state["critical_mask"]
-        # get indices which have same mask value
-        replica_indices = list(np.where(critical_mask == critical_mask[task_index])[0])
-        # check if these indices are in the assignment status of selected node
-        return (
-            np.intersect1d(replica_indices, self.assignment_status[node_index]).size > 0
-        )
+        return self.placement.has_replica(task_index, node_index)
 
     def _get_task_receivers(self, task_index):
         """
         Gets the receivers for a task, mentioned in communication matrix
         """
+        if self.config.comm_edge_list:
+            edges = self.current_state["communications"]
+            return np.sort(edges[edges[:, 0] == task_index, 1])
         receivers = self.current_state["communications"][task_index]
         return np.where(receivers == 1)[0] # return indices
 
@@ -97,14 +249,27 @@ class CadesEnv(gym.Env):
         """
         Gets the senders for a task, mentioned in communication matrix
         """
+        if self.config.comm_edge_list:
+            edges = self.current_state["communications"]
+            return np.sort(edges[edges[:, 1] == task_index, 0])
         senders = self.current_state["communications"][:, task_index]
         return np.where(senders == 1)[0] # return indices
 
+    def _clear_communications(self, senders, receivers):
+        """
+        Removes fulfilled communications from the communication matrix (or edge list)
+        """
+        if self.config.comm_edge_list:
+            edges = self.current_state["communications"]
+            edges[np.isin(edges[:, 0], senders) & np.isin(edges[:, 1], receivers)] = -1
+        else:
+            self.current_state["communications"][senders, receivers] = 0
+
     def _get_tasks_placed_in_node(self, list_of_tasks, node_index):
         """
         Gets the tasks from list_of_tasks which are already present in the node
         """
-        return np.intersect1d(list_of_tasks, self.assignment_status[node_index])
+        return self.placement.tasks_in_node(list_of_tasks, node_index)
 
     def _get_random_valid_task(self):
         """
@@ -116,7 +281,7 @@ class CadesEnv(gym.Env):
         if not valid_task_indices:  # No valid task left
             raise ValueError("No valid task found")
         else:  # Choose a new task from the valid tasks
-            new_task_idx = random.choice(valid_task_indices)
+            new_task_idx = self.rng.pick(valid_task_indices)
         return new_task_idx
     
     def _get_random_valid_node_for_task(self, task_idx):
@@ -129,7 +294,7 @@ class CadesEnv(gym.Env):
         if not valid_node_indices:  # No valid node left
             raise ValueError("No valid node found")
         else:  # Choose a new node from the valid node
-            new_node_idx = random.choice(valid_node_indices)
+            new_node_idx = self.rng.pick(valid_node_indices)
         return new_node_idx
 
     def _exponential_decay_reward(self, step, max_steps, max_reward, k=2):
@@ -155,6 +320,78 @@ class CadesEnv(gym.Env):
         # return factor
         return factor
 
+    def _place_task(self, task_idx, node_idx, task_cost):
+        """
+        Places a valid task in a node, fulfilling its communications with the tasks already placed in the node.
+        Returns the fulfilled receivers and senders and whether all tasks are placed.
+        """
+        if self.jit_kernels is not None:
+            return self._place_task_jit(task_idx, node_idx, task_cost)
+        # Check if the task is communicating
+        task_receivers = self._get_task_receivers(task_idx)
+        task_senders = self._get_task_senders(task_idx)
+        # narrow down the receivers and senders to the ones that are already placed in the node
+        allocated_receivers = self._get_tasks_placed_in_node(task_receivers, node_idx)
+        allocated_senders = self._get_tasks_placed_in_node(task_senders, node_idx)
+        if(len(allocated_receivers) > 0):
+            # set the communication mask to zero
+            self._clear_communications(task_idx, allocated_receivers)
+            # add pair to communication status
+            for receiver in allocated_receivers:
+                self.communication_status.add((task_idx, receiver))
+        if(len(allocated_senders) > 0):
+            # set the communication mask to zero
+            self._clear_communications(allocated_senders, task_idx)
+            # add pair to communication status
+            for sender in allocated_senders:
+                self.communication_status.add((sender, task_idx))
+        # Set the selected task mask value as zero
+        self.current_state["critical_mask"][task_idx] = 0
+        # Mark the selected task as zero
+        self.current_state["tasks"][task_idx] = 0
+        # Consume the space in selected bin
+        self.current_state["nodes"][node_idx] -= task_cost
+        # Update Assignment status
+        self.placement.place(task_idx, node_idx)
+        if self.action_mask_engine is not None:
+            self.action_mask_engine.update(task_idx, node_idx)
+        return allocated_receivers, allocated_senders, sum(self.current_state["tasks"]) == 0
+
+    def _place_task_jit(self, task_idx, node_idx, task_cost):
+        """
+        Same as _place_task, using the compiled kernel
+        """
+        comm_pairs = self._comm_pairs
+        if self.config.comm_edge_list:
+            place_task = self.jit_kernels.place_task_edges
+        else:
+            place_task = self.jit_kernels.place_task
+        num_receivers, num_senders, all_placed = place_task(
+            task_idx,
+            node_idx,
+            task_cost,
+            self.current_state["tasks"],
+            self.current_state["critical_mask"],
+            self.current_state["nodes"],
+            self.current_state["communications"],
+            self.placement.task_node,
+            self.placement.replica_groups,
+            self.placement.node_groups,
+            self.placement.node_task_count,
+            comm_pairs,
+        )
+        self.placement.order.append(task_idx)
+        self.placement.version += 1
+        if self.action_mask_engine is not None:
+            self.action_mask_engine.update(task_idx, node_idx)
+        allocated_receivers = comm_pairs[:num_receivers, 1].copy()
+        allocated_senders = comm_pairs[num_receivers:num_receivers + num_senders, 0].copy()
+        for receiver in allocated_receivers:
+            self.communication_status.add((task_idx, receiver))
+        for sender in allocated_senders:
+            self.communication_status.add((sender, task_idx))
+        return allocated_receivers, allocated_senders, all_placed
+
     def _reward(self, action, training=True):
         """
         Reward function for the environment, returns the episode termination signal and reward for the timestep
@@ -172,7 +409,8 @@ class CadesEnv(gym.Env):
             max_steps = self.env_stats["tasks_len"]
             max_reward = self.config.DUPLICATE_PICK_reward
             reward = self._exponential_decay_reward(step, max_steps, max_reward)
-            reward_type = f"Duplicate Pick Reward on Step {step}: {reward}"
+            if self.trace_rewards:
+                reward_type = f"Duplicate Pick Reward on Step {step}: {reward}"
             if training and self.config.invalid_action_replacement is True:
                 # Select any other valid action
                     valid_task_idx = self._get_random_valid_task()
@@ -189,7 +427,8 @@ class CadesEnv(gym.Env):
                 * (self.info["episode_len"] * self.ep_len_norm_factor) 
                 * 0.25
             )
-            reward_type = f"Node Overflow Reward: {reward}"
+            if self.trace_rewards:
+                reward_type = f"Node Overflow Reward: {reward}"
             # if training and self.config.invalid_action_replacement is True:
             #     # Select any other valid action
             #     valid_node_idx = self._get_random_valid_node_for_task(selected_task_idx)
@@ -208,7 +447,8 @@ class CadesEnv(gym.Env):
                 * (self.info["episode_len"] * self.ep_len_norm_factor)
                 * 0.15
             )
-            reward_type = f"Duplicate Critical Pick Reward: {reward}"
+            if self.trace_rewards:
+                reward_type = f"Duplicate Critical Pick Reward: {reward}"
             done = True
             self.info["termination_cause"] = (
                 str(TerminationCause.DUPLICATE_CRITICAL_PICK)
@@ -222,57 +462,40 @@ class CadesEnv(gym.Env):
                 (self.config.BONUS_reward * self.reward_unit) 
                 * (self.info["episode_len"] * self.ep_len_norm_factor)
             )
-            reward_type = f"Step and Bonus Reward: {reward}"
+            if self.trace_rewards:
+                reward_type = f"Step and Bonus Reward: {reward}"
             if self._is_task_critical(selected_task_idx):
                 reward += self.config.CRITICAL_reward
-                reward_type += f' \nCritical Reward: {reward}'
-            # Check if the task is communicating
-            task_receivers = self._get_task_receivers(selected_task_idx)
-            task_senders = self._get_task_senders(selected_task_idx)
-            # if the task is a sender i.e has receivers
-            if(len(task_receivers) > 0): 
-                # narrow down the receivers to the ones that are already placed in the node
-                allocated_receivers = self._get_tasks_placed_in_node(task_receivers, selected_node_idx)
-                if(len(allocated_receivers) > 0):
-                    # assign reward
-                    reward += (self.config.COMM_reward/self.env_stats["comms_len"]) * len(allocated_receivers)
+                if self.trace_rewards:
+                    reward_type += f' \nCritical Reward: {reward}'
+            # Place the task and fulfil its communications with the tasks already placed in the node
+            allocated_receivers, allocated_senders, all_placed = self._place_task(
+                selected_task_idx, selected_node_idx, selected_task_cost
+            )
+            # if the task is a sender of tasks placed in the node
+            if(len(allocated_receivers) > 0):
+                # assign reward
+                reward += (self.config.COMM_reward/self.env_stats["comms_len"]) * len(allocated_receivers)
+                if self.trace_rewards:
                     reward_type += f' \nCommunication Reward for {selected_task_idx} communicating with {allocated_receivers}: {reward}'
-                    # set the communication mask to zero
-                    self.current_state["communications"][selected_task_idx, allocated_receivers] = 0
-                    # add pair to communication status
-                    for receiver in allocated_receivers:
-                        self.communication_status.add((selected_task_idx, receiver))
-            # if the task is a receiver i.e has senders
-            if(len(task_senders) > 0):
-                # narrow down the senders to the ones that are already placed in the node
-                allocated_senders = self._get_tasks_placed_in_node(task_senders, selected_node_idx)
-                if(len(allocated_senders) > 0):
-                    # assign reward
-                    reward += (self.config.COMM_reward/self.env_stats["comms_len"]) * len(allocated_senders)
+            # if the task is a receiver of tasks placed in the node
+            if(len(allocated_senders) > 0):
+                # assign reward
+                reward += (self.config.COMM_reward/self.env_stats["comms_len"]) * len(allocated_senders)
+                if self.trace_rewards:
                     reward_type += f' \nCommunication Reward for {allocated_senders} communicating with {selected_task_idx}: {reward}'
-                    # set the communication mask to zero
-                    self.current_state["communications"][allocated_senders, selected_task_idx] = 0
-                    # add pair to communication status
-                    for sender in allocated_senders:
-                        self.communication_status.add((sender, selected_task_idx))
-            # Set the selected task mask value as zero
-            self.current_state["critical_mask"][selected_task_idx] = 0
-            # Mark the selected task as zero
-            self.current_state["tasks"][selected_task_idx] = 0
-            # Consume the space in selected bin
-            self.current_state["nodes"][selected_node_idx] -= selected_task_cost
-            # Update Assignment status
-            self.assignment_status[selected_node_idx].append(selected_task_idx)
             self.info["episode_len"] = self.info["episode_len"] + 1
             # Check if no task is remaining
-            if sum(self.current_state["tasks"]) == 0:
+            if all_placed:
                 reward += self.config.SUCCESS_reward
-                reward_type += f"\n Success Reward: {reward}"
+                if self.trace_rewards:
+                    reward_type += f"\n Success Reward: {reward}"
                 self.info["termination_cause"] = str(TerminationCause.SUCCESS)
                 self.info["is_success"] = True
                 done = True
 
-        self.info["reward_type"] += f'{reward_type}\n'
+        if self.trace_rewards:
+            self.info["reward_type"] += f'{reward_type}\n'
         return reward, done
     
     def _get_lowest_cost_task(self):
@@ -294,7 +517,20 @@ class CadesEnv(gym.Env):
         cost = self.current_state["tasks"][task_index]
         return self.current_state["nodes"][node_index] >= cost
     
+    def _decode_action(self, action):
+        """
+        Converts a flat action i.e. index of a (task, node) pair into [task, node]
+        """
+        if np.ndim(action) == 0:
+            return np.array(divmod(int(action), self.config.max_num_nodes))
+        return action
+
     def action_masks(self):
+        if self.action_mask_engine is not None:
+            # Joint mask of valid (task, node) pairs for the flat action space
+            return self.action_mask_engine.mask().flatten()
+        if self.jit_kernels is not None:
+            return self.jit_kernels.action_masks(self.current_state["tasks"], self.current_state["nodes"])
         action_dim1 = self.config.max_num_tasks
         action_dim2 = self.config.max_num_nodes
         mask_dim1 = np.zeros(action_dim1, dtype=bool)
@@ -332,18 +568,10 @@ class CadesEnv(gym.Env):
             f"Termination Cause: {self.info['termination_cause']}\n"
         )
 
-    def step(self, action, training=True):
+    def _update_eval_metrics(self):
         """
-        Advances the episode by one timestep using the given action. 
+        Calculates the evaluation metrics of the current placement
         """
-         # Calc Rewards
-        reward, done = self._reward(action, training)
-        # Save Info about Episode
-        self.info["commnication_status"] = self.communication_status
-        self.info["assignment_status"] = self.assignment_status
-        self.env_stats["intranode_comms_len"] = len(self.communication_status)
-
-        # Calculate Evaluation Metrics
         self.info["avg_node_occupancy"] = get_avg_node_occupancy(
             self.initial_state["nodes"] * self.norm_factor, # nodes total capacities
             self.current_state["nodes"] * self.norm_factor # nodes remaining capacities
@@ -359,6 +587,23 @@ class CadesEnv(gym.Env):
         self.info["empty_nodes"] = get_empty_nodes_percentage(
             self.assignment_status
         )
+
+    def step(self, action, training=True):
+        """
+        Advances the episode by one timestep using the given action. 
+        """
+        action = self._decode_action(action)
+         # Calc Rewards
+        reward, done = self._reward(action, training)
+        # Save Info about Episode
+        self.info["commnication_status"] = self.communication_status
+        # The list view is only built at the end of the episode, as the placement is reused by reset
+        self.info["assignment_status"] = self.placement.to_list() if done else self.assignment_status
+        self.env_stats["intranode_comms_len"] = len(self.communication_status)
+
+        # Calculate Evaluation Metrics (only at the end of the episode in fast step mode)
+        if done is True or not self.config.fast_step:
+            self._update_eval_metrics()
         # if done is True:
             # Add reward based on avg active node occupancy
             # reward += self.config.NODE_OCCUPANCY_reward * (self.info["avg_active_node_occupancy"] / 100)
@@ -379,64 +624,60 @@ class CadesEnv(gym.Env):
         """
         Generates states for the environment
         """
-        (
-            tasks,
-            num_tasks,
-            nodes,
-            num_nodes
-        ) = self.states_generator.generate_tasks_and_nodes()
-        critical_mask = self.states_generator.generate_critical_tasks_and_replicas(
-            tasks, num_tasks
-        )
         # Use graph during evaluation and also in training if specified
         use_graph = (not training) or self.config.use_comm_graph_in_train
-        comms, num_comms = self.states_generator.generate_communications(
-            tasks, num_tasks, critical_mask, graph=use_graph
-        )
-        generated_states = {
-            "tasks": tasks,
-            "num_tasks": num_tasks,
-            "critical_mask": critical_mask,
-            "nodes": nodes,
-            "num_nodes": num_nodes,
-            "communications": comms,
-            "num_communications": num_comms,
-        }
-        return generated_states
+        return self.states_generator.generate_states(graph=use_graph)
 
     def reset(self, states=None, training=True):
         """
         Initializes new states for the start of a new episode.
         """
-        # assignment status is an variable-sized 2D Array, having dimensions total_nodes x (size of node)
-        # it stores the indices of task assignment on the nodes
-        self.assignment_status = []
         self.communication_status = set()
         self.info = {"is_success": False, "episode_len": 0, "termination_cause": None, "reward_type": "", "total_reward": 0}
+        if states is None and training in self.corpus_streams:
+            states = next(self.corpus_streams[training])
+        if states is None and self.instance_prefetcher is not None:
+            prefetched = self.instance_prefetcher.pop(training)
+            if prefetched is not None:
+                states, rng_state = prefetched
+                # Continue the random stream as if the instance had been generated here
+                self.rng.set_state(rng_state)
         if states is None:
             states = self.generate_states(training)
-        for _ in range(states["num_nodes"]):
-            self.assignment_status.append([])
+        if "feasible" in states:
+            self.info["feasible"] = bool(states["feasible"])
+        if "feasibility_stats" in states:
+            self.count_feasibility_stats(states["feasibility_stats"], training)
+        self.placement.reset(states["num_nodes"], states["critical_mask"])
         # norm factor is the largest node size
         self.norm_factor = np.max(states["nodes"])
         # critical norm factor is the largest mask value in critical mask
         self.critical_norm_factor = np.max(states["critical_mask"]) or 1 # to avoid division by zero if no critical task
-        observation = {
-            "tasks": np.array(states["tasks"] / self.norm_factor),
-            "critical_mask": np.array(states["critical_mask"] / self.critical_norm_factor),
-            "nodes": np.array(states["nodes"] / self.norm_factor),
-            "communications": np.array(states["communications"]),
-        }
-        self.initial_state = copy.deepcopy(observation)
+        observation = self._observation_buffers[self._observation_buffer_idx]
+        self._observation_buffer_idx = 1 - self._observation_buffer_idx
+        np.divide(states["tasks"], self.norm_factor, out=observation["tasks"])
+        np.divide(states["critical_mask"], self.critical_norm_factor, out=observation["critical_mask"])
+        np.divide(states["nodes"], self.norm_factor, out=observation["nodes"])
+        # Caller provided communications may have another integer dtype than the buffer
+        np.copyto(observation["communications"], states["communications"], casting="unsafe")
+        for key, value in observation.items():
+            np.copyto(self.initial_state[key], value)
+        self._frozen_initial_state = None
         self.current_state = observation
+        if self.action_mask_engine is not None:
+            communications = states["communications"]
+            if self.config.comm_edge_list:
+                communications = edge_list_to_matrix(communications, self.config.max_num_tasks)
+            self.action_mask_engine.reset(
+                observation["tasks"],
+                observation["nodes"],
+                states["critical_mask"],
+                communications,
+            )
         self.env_stats["tasks_len"] = states["num_tasks"]
         self.env_stats["comms_len"] = states["num_communications"]
-        self.env_stats["tasks_total_cost"] = sum(
-            observation["tasks"] * self.norm_factor
-        )
-        self.env_stats["nodes_total_capacity"] = sum(
-            observation["nodes"] * self.norm_factor
-        )
+        self.env_stats["tasks_total_cost"] = float(np.sum(states["tasks"]))
+        self.env_stats["nodes_total_capacity"] = float(np.sum(states["nodes"]))
         self.env_stats["extra_capacity"] = (
             round(
                 1
@@ -453,11 +694,85 @@ class CadesEnv(gym.Env):
 
         return observation
 
+    def _get_frozen_initial_state(self):
+        # The initial state does not change during an episode, so it is copied once and shared by all snapshots
+        if self._frozen_initial_state is None:
+            self._frozen_initial_state = _frozen_copy(self.initial_state)
+        return self._frozen_initial_state
+
+    def snapshot(self, include_rng=True):
+        """
+        Captures the complete mid-episode state (states, placement, communications, info and RNG)
+        so that it can be restored later e.g. to search over different actions from the same state.
+        Saving the RNG state is the most expensive part, it can be skipped with include_rng=False
+        when the search does not rely on them (steps only draw random numbers for invalid action replacement).
+        """
+        # Assignment and communication status are restored from the placement and communication_status
+        info = {
+            key: value for key, value in self.info.items()
+            if key not in ("assignment_status", "commnication_status")
+        }
+        return EnvSnapshot(
+            current_state=_frozen_copy(self.current_state),
+            initial_state=self._get_frozen_initial_state(),
+            placement=self.placement.snapshot(),
+            action_mask=(
+                MappingProxyType(self.action_mask_engine.snapshot())
+                if self.action_mask_engine is not None else None
+            ),
+            communication_status=frozenset(self.communication_status),
+            info=MappingProxyType(info),
+            env_stats=MappingProxyType(dict(self.env_stats)),
+            norm_factors=(self.norm_factor, self.critical_norm_factor, self.reward_unit, self.ep_len_norm_factor),
+            rng_state=self.rng.get_state() if include_rng else None,
+        )
+
+    def restore(self, snapshot):
+        """
+        Restores a state captured by snapshot. The previous observation is left untouched.
+        """
+        observation = self._observation_buffers[self._observation_buffer_idx]
+        self._observation_buffer_idx = 1 - self._observation_buffer_idx
+        for key, value in snapshot.current_state.items():
+            observation[key][...] = value
+        if snapshot.initial_state is not self._frozen_initial_state:
+            for key, value in snapshot.initial_state.items():
+                self.initial_state[key][...] = value
+            self._frozen_initial_state = snapshot.initial_state
+        self.current_state = observation
+        self.placement.restore(snapshot.placement)
+        if self.action_mask_engine is not None:
+            self.action_mask_engine.restore(snapshot.action_mask, observation["tasks"], observation["nodes"])
+        self.communication_status = set(snapshot.communication_status)
+        self.info = dict(snapshot.info)
+        self.info["commnication_status"] = self.communication_status
+        self.info["assignment_status"] = self.assignment_status
+        self.env_stats = dict(snapshot.env_stats)
+        (self.norm_factor, self.critical_norm_factor, self.reward_unit, self.ep_len_norm_factor) = snapshot.norm_factors
+        if snapshot.rng_state is not None:
+            self.rng.set_state(snapshot.rng_state)
+        return observation
+
     def render(self, mode="human"):
         pass
 
     def get_env_info(self):
         return self.env_stats
 
+    def count_feasibility_stats(self, stats, training=True):
+        for key, value in stats.items():
+            self.feasibility_stats[training][key] += value
+
+    def move_feasibility_stats(self, since):
+        """
+        Moves the training feasibility stats counted since the `since` snapshot to the evaluation stats,
+        for evaluation episodes which are reset in training mode (MetricsCallback)
+        """
+        moved = {key: self.feasibility_stats[True][key] - value for key, value in since.items()}
+        self.count_feasibility_stats({key: -value for key, value in moved.items()}, True)
+        self.count_feasibility_stats(moved, False)
+
     def close(self):
-        pass
+        if self.instance_prefetcher is not None:
+            self.instance_prefetcher.close()
+            self.instance_prefetcher = None
@@ -1,45 +1,103 @@
-import networkx as nx
 import numpy as np
 
+def pad_edge_list(edges, max_num_comms):
+    """
+    Converts a list of (sender, receiver) pairs into a fixed size array padded with -1
+    """
+    padded = np.full((max_num_comms, 2), -1, dtype=np.int32)
+    if len(edges) > 0:
+        padded[:len(edges)] = edges
+    return padded
+
+def edge_list_to_matrix(edges, num_tasks):
+    """
+    Converts a padded edge list into a dense communication matrix
+    """
+    matrix = np.zeros((num_tasks, num_tasks), dtype=np.uint8)
+    edges = edges[edges[:, 0] >= 0]
+    matrix[edges[:, 0], edges[:, 1]] = 1
+    return matrix
+
 class CommunicationGraph:
-    def __init__(self, max_depth):
+    """
+    Directed acyclic graph of communications between tasks. The ancestors (and descendants) of
+    every task are kept as boolean matrices which are updated incrementally when an edge is added,
+    together with the depth, the total cost and the replica groups of the ancestors of every task,
+    so that queries are lookups instead of graph traversals.
+    """
+
+    def __init__(self, max_depth, costs=None, groups=None):
         self.max_depth = max_depth
-        self.graph = nx.DiGraph()
-        for i in range(max_depth):
-            self.graph.add_node(i)
+        self.costs = np.zeros(max_depth, dtype=np.int64) if costs is None else np.asarray(costs)
+        # replica group of each task as a bit, groups of the ancestors are OR-ed together
+        groups = np.zeros(max_depth, dtype=np.int64) if groups is None else np.asarray(groups).astype(np.int64)
+        self.group_bits = np.left_shift(1, groups)
+        self.ancestors = np.zeros((max_depth, max_depth), dtype=bool)
+        self.descendants = np.zeros((max_depth, max_depth), dtype=bool)
+        self.children = [[] for _ in range(max_depth)]
+        self.depths = np.ones(max_depth, dtype=np.int64)
+        self.ancestors_cost = np.zeros(max_depth, dtype=self.costs.dtype)
+        self.ancestors_groups = np.zeros(max_depth, dtype=np.int64)
+
+    def __contains__(self, name):
+        return 0 <= name < len(self.children)
 
     def get_or_create_node(self, name):
-        if name not in self.graph:
-            self.graph.add_node(name)
+        if name not in self:
+            # grow the tables, new nodes have no cost and no replica group
+            grow = name + 1 - len(self.children)
+            self.costs = np.pad(self.costs, (0, grow))
+            self.group_bits = np.pad(self.group_bits, (0, grow), constant_values=1)
+            self.ancestors = np.pad(self.ancestors, (0, grow))
+            self.descendants = np.pad(self.descendants, (0, grow))
+            self.children.extend([] for _ in range(grow))
+            self.depths = np.pad(self.depths, (0, grow), constant_values=1)
+            self.ancestors_cost = np.pad(self.ancestors_cost, (0, grow))
+            self.ancestors_groups = np.pad(self.ancestors_groups, (0, grow))
         return name
 
     def add_edge(self, parent, child):
-        self.graph.add_edge(parent, child)
+        if child in self.children[parent]:
+            return
+        self.children[parent].append(child)
+        # parent and its ancestors become ancestors of child and its descendants
+        new_ancestors = self.ancestors[parent].copy()
+        new_ancestors[parent] = True
+        new_descendants = self.descendants[child].copy()
+        new_descendants[child] = True
+        self.ancestors[np.ix_(new_descendants, new_ancestors)] = True
+        self.descendants[np.ix_(new_ancestors, new_descendants)] = True
+        # refresh the cached values of the nodes which got new ancestors
+        ancestors = self.ancestors[new_descendants]
+        self.depths[new_descendants] = ancestors.sum(axis=1) + 1
+        self.ancestors_cost[new_descendants] = ancestors @ self.costs
+        self.ancestors_groups[new_descendants] = np.bitwise_or.reduce(
+            np.where(ancestors, self.group_bits, 0), axis=1
+        )
 
     def add_edges(self, edges):
         for parent, child in edges:
             self.add_edge(parent, child)
 
     def get_ancestors(self, name):
-        
-        if name not in self.graph:
+        if name not in self:
             return []
-        return list(nx.ancestors(self.graph, name))
-    
+        return list(np.flatnonzero(self.ancestors[name]))
+
     def get_node_depth(self, name):
         """
-        Find the depth of a node given its name, considering the shortest path from any root node.
-        Each root node has a depth of 0. Returns the minimum depth if multiple paths exist.
+        Depth of a node i.e. the number of its ancestors + 1
         """
-        if name not in self.graph:
+        if name not in self:
             return None
-        
-        ancestors = self.get_ancestors(name)
-        return len(ancestors) + 1
-        
+        return int(self.depths[name])
+
     def to_matrix(self):
-        adj_matrix = nx.adjacency_matrix(self.graph)
-        # Convert to a dense format for easy handling or printing
-        dense_matrix = adj_matrix.todense()
-        # Convert the dense matrix to a numpy array of dtype uint8
-        return np.array(dense_matrix, dtype=np.uint8)
\ No newline at end of file
+        matrix = np.zeros((len(self.children), len(self.children)), dtype=np.uint8)
+        for parent, children in enumerate(self.children):
+            matrix[parent, children] = 1
+        return matrix
+
+    def to_edge_list(self, max_num_comms):
+        edges = [(parent, child) for parent, children in enumerate(self.children) for child in children]
+        return pad_edge_list(edges, max_num_comms)
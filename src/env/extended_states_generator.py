@@ -1,6 +1,5 @@
 import numpy as np
-import random
-from env.comm_graph import CommunicationGraph
+from env.comm_graph import CommunicationGraph, pad_edge_list
 from env.states_generator import StatesGenerator
 
 class ExtendedStatesGenerator(StatesGenerator):
@@ -15,107 +14,83 @@ class ExtendedStatesGenerator(StatesGenerator):
         self.max_comm_chain = config.max_comm_chain
         self.non_critical_comm = config.non_critical_comm
         self.critical_comm = config.critical_comm
+        # communications are generated as a padded (sender, receiver) list instead of a matrix
+        self.comm_edge_list = config.comm_edge_list
+        self.max_num_comms_bound = max(self.max_num_comms, 1)
 
     def _get_random_comm_count(self):
         # Generate random number of communications
-        return np.random.randint(self.min_num_comms, self.max_num_comms + 1)
+        return self.rng.integers(self.min_num_comms, self.max_num_comms + 1)
     
     def _graph_valid_senders(self, comm_graph: CommunicationGraph, valid_tasks):
         """
-        Get valid senders from communication graph i.e. 
+        Get valid senders from communication graph i.e. tasks whose depth is below max_comm_chain
         """
-        valid_senders_depths = {}
-        for task in valid_tasks:
-            depth = comm_graph.get_node_depth(task)
-            if depth is None:
-                valid_senders_depths[task] = 0
-            elif depth < self.max_comm_chain:
-                valid_senders_depths[task] = depth
-        return valid_senders_depths
+        return valid_tasks[comm_graph.depths[valid_tasks] < self.max_comm_chain]
 
-    def _graph_valid_receivers(self, comm_graph: CommunicationGraph, valid_senders_depths, sender, mask, cost):
+    def _graph_valid_receivers(self, comm_graph: CommunicationGraph, valid_senders, sender):
         """
         Get valid receivers for a sender
         """
-        valid_receivers = list(valid_senders_depths.keys())
         # exclude sender from possible receivers
-        valid_receivers.remove(sender)
-        # get ancestors of sender
-        sender_ancestors = comm_graph.get_ancestors(sender)
-        # get sender's depth, cost and critical mask value
-        sender_depth = valid_senders_depths[sender]
-        sender_cost = cost[sender]
-        sender_critical_mask = mask[sender]
-        # loop through all valid receivers and check if they satisfy all conditions
-        final_receivers = []
-        for receiver in valid_receivers:
+        receivers = valid_senders[valid_senders != sender]
+        # cost and replica groups of a task together with its ancestors
+        costs = comm_graph.costs + comm_graph.ancestors_cost
+        groups = comm_graph.group_bits | comm_graph.ancestors_groups
+        # mask values 0 and 1 are not taken into account in the intersection
+        ignored_groups = np.int64(0b11)
+        valid = (
             # 1. Is not ancestor of sender
-            if receiver in sender_ancestors:
-                continue
+            ~comm_graph.ancestors[sender, receivers]
             # 2. Longest depth of sender + Longest depth of receiver ≤ max_comm_length
-            receiver_depth = valid_senders_depths[receiver]
-            if sender_depth + receiver_depth > self.max_comm_chain:
-                continue
+            & (comm_graph.depths[sender] + comm_graph.depths[receivers] <= self.max_comm_chain)
             # 3. Cost of ancestors of sender + sender cost + Cost of ancestors of receiver + Cost of receiver ≤ avg_node_bin_size
-            receiver_ancestors = comm_graph.get_ancestors(receiver)
-            receiver_cost = cost[receiver]
-            sender_ancestors_cost = sum([cost[ancestor] for ancestor in sender_ancestors])
-            receiver_ancestors_cost = sum([cost[ancestor] for ancestor in receiver_ancestors])
-            if sender_cost + sender_ancestors_cost + receiver_cost + receiver_ancestors_cost > self.max_node_size:
-                continue
+            & (costs[sender] + costs[receivers] <= self.max_node_size)
             # 4. Intersection of critical mask values of (sender + its ancestors) and (receiver + its ancestors) should be None
-            receiver_critical_mask = mask[receiver]
-            sender_ancestors_critical_mask = [mask[ancestor] for ancestor in sender_ancestors]
-            receiver_ancestors_critical_mask = [mask[ancestor] for ancestor in receiver_ancestors]
-            combined_sender_masks = np.concatenate(([sender_critical_mask], sender_ancestors_critical_mask))
-            combined_receiver_masks = np.concatenate(([receiver_critical_mask], receiver_ancestors_critical_mask))
-            # Find intersection between the combined masks of sender and receiver
-            intersection = np.intersect1d(combined_sender_masks, combined_receiver_masks)
-            intersection = np.setdiff1d(intersection, np.array([0, 1]))
-            if len(intersection) > 0:
-                continue
-            # if all conditions are satisfied, add receiver to final_receivers
-            final_receivers.append(receiver)
-        return final_receivers
+            & ((groups[sender] & groups[receivers] & ~ignored_groups) == 0)
+        )
+        return receivers[valid]
     
     def _generate_graph_comm_matrix(self, tasks, num_tasks, critical_mask, valid_tasks):
         # Initialize communication graph
-        comm_graph = CommunicationGraph(max_depth=self.max_num_tasks)
+        comm_graph = CommunicationGraph(max_depth=self.max_num_tasks, costs=tasks, groups=critical_mask)
         # Get number of communications
         required_num_comms = self._get_random_comm_count()
         num_comms = 0
         for _ in range(required_num_comms):
             # get valid senders
-            valid_senders_depths = self._graph_valid_senders(comm_graph, valid_tasks)
-            valid_senders = list(valid_senders_depths.keys())
+            valid_senders = self._graph_valid_senders(comm_graph, valid_tasks)
             # select random sender
-            sender = random.choice(valid_senders)
+            sender = self.rng.pick(valid_senders)
             # get valid receivers for sender
-            valid_receivers = self._graph_valid_receivers(comm_graph, valid_senders_depths, sender, critical_mask, tasks)
+            valid_receivers = self._graph_valid_receivers(comm_graph, valid_senders, sender)
             # if there are no valid receivers, continue
             if len(valid_receivers) == 0:
                 continue
             # select random receiver among valid receivers
-            receiver = random.choice(valid_receivers)
+            receiver = self.rng.pick(valid_receivers)
             # update comms matrix
             comm_graph.add_edge(sender, receiver)
             num_comms += 1
+        if self.comm_edge_list:
+            return comm_graph.to_edge_list(self.max_num_comms_bound), num_comms
         return comm_graph.to_matrix(), num_comms
     
     def _generate_simple_comm_matrix(self, tasks, num_tasks, critical_mask, valid_tasks):
-        # Initialize communication matrix
-        comms = np.zeros((self.max_num_tasks, self.max_num_tasks), dtype="uint8")
+        # Initialize communication pairs and the receivers of each sender
+        pairs = []
+        sender_receivers = {}
         # Get number of communications
         required_num_comms = self._get_random_comm_count()
         num_comms = 0
         for _ in range(required_num_comms):
             # select random sender
-            sender = random.choice(valid_tasks)
+            sender = self.rng.pick(valid_tasks)
             # remove sender from valid_tasks
             valid_receivers = np.setdiff1d(valid_tasks, np.array([sender]))
             # remove receivers which are already communicating with sender (handling duplicate entries)
             valid_receivers = np.setdiff1d(
-                valid_receivers, np.where(comms[sender] == 1)[0]
+                valid_receivers, list(sender_receivers.get(sender, ()))
             )
             # get sender's mask value
             sender_mask = critical_mask[sender]
@@ -131,9 +106,15 @@ class ExtendedStatesGenerator(StatesGenerator):
             if len(valid_receivers) == 0:
                 continue
             # select random receiver
-            receiver = random.choice(valid_receivers)
-            comms[sender, receiver] = 1
+            receiver = self.rng.pick(valid_receivers)
+            pairs.append((sender, receiver))
+            sender_receivers.setdefault(sender, set()).add(receiver)
             num_comms += 1
+        if self.comm_edge_list:
+            return pad_edge_list(pairs, self.max_num_comms_bound), num_comms
+        comms = np.zeros((self.max_num_tasks, self.max_num_tasks), dtype="uint8")
+        for sender, receiver in pairs:
+            comms[sender, receiver] = 1
         return comms, num_comms
 
     def generate_communications(self, tasks, num_tasks, critical_mask, graph = False):
@@ -152,6 +133,114 @@ class ExtendedStatesGenerator(StatesGenerator):
         else:
             comms = self._generate_simple_comm_matrix(tasks, num_tasks, critical_mask, valid_tasks)
         return comms
+
+    def generate_states(self, graph = False):
+        """
+        Generates a complete problem instance i.e. tasks, nodes, critical mask and communications
+        """
+        (
+            tasks,
+            num_tasks,
+            nodes,
+            num_nodes,
+            critical_mask,
+            feasible,
+            feasibility_stats
+        ) = self.generate_tasks_nodes_and_replicas()
+        comms, num_comms = self.generate_communications(
+            tasks, num_tasks, critical_mask, graph=graph
+        )
+        generated_states = {
+            "tasks": tasks,
+            "num_tasks": num_tasks,
+            "critical_mask": critical_mask,
+            "nodes": nodes,
+            "num_nodes": num_nodes,
+            "communications": comms,
+            "num_communications": num_comms,
+        }
+        if feasible is not None:
+            generated_states["feasible"] = feasible
+            generated_states["feasibility_stats"] = feasibility_stats
+        return generated_states
     
-    def generate_communications_batch(self):
-        assert("Not implemented")
\ No newline at end of file
+    def generate_communications_batch(self, tasks, num_tasks, critical_mask, graph = False):
+        """
+        Batched version of generate_communications. The simple generator draws the sender and
+        receiver of every communication for all instances at once. The graph generator is
+        sequential and is run per instance.
+        """
+        batch_size = len(tasks)
+        if graph:
+            comms, num_comms = zip(*[
+                self.generate_communications(tasks[i], num_tasks[i], critical_mask[i], graph=True)
+                for i in range(batch_size)
+            ])
+            return np.stack(comms), np.array(num_comms)
+        rows = np.arange(batch_size)
+        # Get valid tasks
+        valid_tasks = tasks > 0
+        # Define preliminary communication restrictions
+        if self.non_critical_comm and not self.critical_comm:
+            valid_tasks &= critical_mask == 0
+        elif not self.non_critical_comm and self.critical_comm:
+            valid_tasks = critical_mask > 0
+        has_valid_tasks = valid_tasks.any(axis=1)
+        # Get number of communications
+        required_num_comms = self.rng.integers(self.min_num_comms, self.max_num_comms + 1, size=batch_size)
+        num_comms = np.zeros(batch_size, dtype=np.int64)
+        comms = np.zeros((batch_size, self.max_num_tasks, self.max_num_tasks), dtype="uint8")
+        if self.comm_edge_list:
+            edges = np.full((batch_size, self.max_num_comms_bound, 2), -1, dtype=np.int32)
+        for step in range(required_num_comms.max(initial=0)):
+            active = (step < required_num_comms) & has_valid_tasks
+            # select random sender, a uniform choice among valid tasks is the argmax of random keys
+            sender = np.argmax(np.where(valid_tasks, self.rng.random(valid_tasks.shape), -1), axis=1)
+            sender_mask = critical_mask[rows, sender]
+            # valid receivers are the valid tasks other than the sender, which are not already
+            # communicating with the sender and, for critical senders, are not its replicas
+            valid_receivers = valid_tasks & (comms[rows, sender] == 0)
+            valid_receivers[rows, sender] = False
+            valid_receivers &= ~((sender_mask[:, None] > 0) & (critical_mask == sender_mask[:, None]))
+            # if there are no valid receivers, continue
+            active &= valid_receivers.any(axis=1)
+            # select random receiver
+            receiver = np.argmax(np.where(valid_receivers, self.rng.random(valid_receivers.shape), -1), axis=1)
+            comms[rows[active], sender[active], receiver[active]] = 1
+            if self.comm_edge_list:
+                edges[rows[active], num_comms[active], 0] = sender[active]
+                edges[rows[active], num_comms[active], 1] = receiver[active]
+            num_comms += active
+        if self.comm_edge_list:
+            return edges, num_comms
+        return comms, num_comms
+
+    def generate_states_batch(self, batch_size, graph = False):
+        """
+        Generates batch_size problem instances at once, every entry is stacked along the first axis
+        """
+        (
+            tasks,
+            num_tasks,
+            nodes,
+            num_nodes,
+            critical_mask,
+            feasible,
+            feasibility_stats
+        ) = self.generate_tasks_nodes_and_replicas_batch(batch_size)
+        comms, num_comms = self.generate_communications_batch(
+            tasks, num_tasks, critical_mask, graph=graph
+        )
+        generated_states = {
+            "tasks": tasks,
+            "num_tasks": num_tasks,
+            "critical_mask": critical_mask,
+            "nodes": nodes,
+            "num_nodes": num_nodes,
+            "communications": comms,
+            "num_communications": num_comms,
+        }
+        if feasible is not None:
+            generated_states["feasible"] = feasible
+            generated_states["feasibility_stats"] = feasibility_stats
+        return generated_states
\ No newline at end of file
@@ -0,0 +1,74 @@
+import numpy as np
+
+# Reasons for which an instance can not be solved, in the order they are checked
+INFEASIBILITY_REASONS = ("capacity", "task_size", "replicas", "ffd")
+
+# Number of checked, rejected (regenerated) and flagged instances, and of failures per reason
+FEASIBILITY_STATS = ("checked", "rejected", "flagged", *INFEASIBILITY_REASONS)
+
+
+def merge_feasibility_stats(stats):
+    """
+    Sums feasibility stats e.g. of the environments of several workers
+    """
+    return {key: sum(entry[key] for entry in stats) for key in FEASIBILITY_STATS}
+
+
+def _ffd_probe(tasks, critical_mask, nodes):
+    """
+    First-Fit-Decreasing placement of every instance of the batch, replicas of a critical task
+    are kept in different nodes. Returns whether all tasks could be placed.
+    It runs in O(tasks x nodes) and can reject a few instances which are actually solvable.
+    """
+    batch_size, num_tasks = tasks.shape
+    rows = np.arange(batch_size)
+    groups = critical_mask.astype(np.int64)
+    remaining = nodes.astype(np.float64)
+    # whether a replica group is placed in a node (batch x nodes x groups)
+    node_groups = np.zeros((batch_size, nodes.shape[1], groups.max(initial=0) + 1), dtype=bool)
+    order = np.argsort(-tasks, axis=1, kind="stable")
+    placed = np.ones(batch_size, dtype=bool)
+    for i in range(num_tasks):
+        task = order[:, i]
+        cost = tasks[rows, task]
+        group = groups[rows, task]
+        candidates = (remaining >= cost[:, None]) & ~(node_groups[rows, :, group] & (group > 0)[:, None])
+        has_candidate = candidates.any(axis=1)
+        # padded tasks have no cost and are skipped
+        place = (cost > 0) & has_candidate
+        placed &= (cost == 0) | has_candidate
+        node = np.argmax(candidates, axis=1)
+        remaining[rows[place], node[place]] -= cost[place]
+        node_groups[rows[place], node[place], group[place]] = True
+    return placed
+
+
+def infeasibility_reasons(tasks, critical_mask, nodes, num_nodes, ffd_probe=False):
+    """
+    Checks a batch of instances (stacked along the first axis) and returns, for each of them,
+    0 if no problem was found or the index + 1 of the first failed check in INFEASIBILITY_REASONS:
+    - capacity: total task cost exceeds the total node capacity
+    - task_size: a task is larger than every node
+    - replicas: a critical task and its replicas need more distinct nodes than available
+    - ffd: (optional) First-Fit-Decreasing can not place every task
+    """
+    reasons = np.zeros(len(tasks), dtype=np.int64)
+
+    def fail(reason, failed):
+        reasons[(reasons == 0) & failed] = INFEASIBILITY_REASONS.index(reason) + 1
+
+    fail("capacity", tasks.sum(axis=1) > nodes.sum(axis=1))
+    fail("task_size", tasks.max(axis=1) > nodes.max(axis=1))
+    groups = critical_mask.astype(np.int64)
+    if groups.max(initial=0) > 0:
+        # largest replica group of each instance
+        group_sizes = np.stack([(groups == group).sum(axis=1) for group in range(1, groups.max() + 1)], axis=1)
+        fail("replicas", group_sizes.max(axis=1) > num_nodes)
+    if ffd_probe:
+        unchecked = reasons == 0
+        if unchecked.any():
+            placed = _ffd_probe(tasks[unchecked], critical_mask[unchecked], nodes[unchecked])
+            failed = np.zeros(len(tasks), dtype=bool)
+            failed[unchecked] = ~placed
+            fail("ffd", failed)
+    return reasons
@@ -0,0 +1,108 @@
+import json
+import os
+import numpy as np
+
+COLUMNS = (
+    "tasks",
+    "num_tasks",
+    "critical_mask",
+    "nodes",
+    "num_nodes",
+    "communications",
+    "num_communications",
+)
+
+
+def _column_dtypes(config):
+    """
+    Smallest dtypes which can hold the values of each column for the given config
+    """
+    size_dtype = np.min_scalar_type(max(config.max_task_size, config.max_node_size))
+    count_dtype = np.min_scalar_type(max(config.max_num_tasks, config.max_num_nodes, config.max_num_comms))
+    return {
+        "tasks": size_dtype,
+        "num_tasks": count_dtype,
+        "critical_mask": np.min_scalar_type(config.number_of_critical_tasks),
+        "nodes": size_dtype,
+        "num_nodes": count_dtype,
+        # edge lists are padded with -1
+        "communications": np.min_scalar_type(-config.max_num_tasks) if config.comm_edge_list else np.uint8,
+        "num_communications": count_dtype,
+    }
+
+
+def build_corpus(generator, config, path, num_instances, graph=False, batch_size=65536):
+    """
+    Generates num_instances instances with the batched generator and writes them to path,
+    one .npy file per column. The metadata file is written last and marks the corpus as complete.
+    """
+    os.makedirs(path, exist_ok=True)
+    dtypes = _column_dtypes(config)
+    columns = {}
+    for start in range(0, num_instances, batch_size):
+        stop = min(start + batch_size, num_instances)
+        states = generator.generate_states_batch(stop - start, graph=graph)
+        for name in COLUMNS:
+            values = np.asarray(states[name])
+            if name not in columns:
+                columns[name] = np.lib.format.open_memmap(
+                    os.path.join(path, f"{name}.npy"),
+                    mode="w+",
+                    dtype=dtypes[name],
+                    shape=(num_instances, *values.shape[1:]),
+                )
+            columns[name][start:stop] = values
+    for column in columns.values():
+        column.flush()
+    with open(os.path.join(path, "meta.json"), "w") as file:
+        json.dump({"num_instances": num_instances, "graph": graph, "config": vars(config)}, file, indent=2)
+
+
+class InstanceCorpus:
+    """
+    Read-only, memory-mapped corpus of instances written by build_corpus.
+    Instances are returned as dicts of views on the mapped columns, so nothing is copied
+    until the environment reads them.
+    """
+
+    def __init__(self, path):
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.isfile(meta_path):
+            raise FileNotFoundError(f"Instance corpus '{path}' not found or incomplete.")
+        with open(meta_path, "r") as file:
+            self.meta = json.load(file)
+        self.path = path
+        self.columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in COLUMNS}
+
+    def __len__(self):
+        return self.meta["num_instances"]
+
+    def __getitem__(self, index):
+        return {name: column[index] for name, column in self.columns.items()}
+
+    def check_shapes(self, observation_space):
+        """
+        Checks that the instances have the shapes of the environment observations
+        """
+        for name in ("tasks", "critical_mask", "nodes", "communications"):
+            shape = self.columns[name].shape[1:]
+            if shape != observation_space[name].shape:
+                raise ValueError(
+                    f"Instance corpus '{self.path}' has {name} of shape {shape}, "
+                    f"expected {observation_space[name].shape}"
+                )
+
+    def stream(self, shuffle=True, chunk_size=4096, seed=None):
+        """
+        Endless stream of instances. When shuffled, the corpus is read chunk by chunk in a
+        random order and the instances of each chunk are shuffled, so that reads stay sequential.
+        The order only depends on seed, runs with the same seed get the same instances.
+        """
+        rng = np.random.default_rng(seed)
+        starts = np.arange(0, len(self), chunk_size)
+        while True:
+            for start in (rng.permutation(starts) if shuffle else starts):
+                stop = min(start + chunk_size, len(self))
+                chunk = {name: column[start:stop] for name, column in self.columns.items()}
+                for row in (rng.permutation(stop - start) if shuffle else range(stop - start)):
+                    yield {name: column[row] for name, column in chunk.items()}
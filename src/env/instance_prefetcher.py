@@ -0,0 +1,86 @@
+import multiprocessing
+from collections import OrderedDict
+from env.extended_states_generator import ExtendedStatesGenerator
+from utils.rng import GLOBAL_RNG, StreamRNG
+
+# States generator of the worker process
+_worker_generator = None
+
+
+def _init_worker(config):
+    global _worker_generator
+    _worker_generator = ExtendedStatesGenerator(config)
+
+
+def _generate_states(seed, graph):
+    """
+    Generates the instance of an episode seed, along with the random state after the generation
+    so that the environment can continue the same random stream as if it had generated it.
+    The seed is either a global seed or the key of a counter-based stream (see CadesEnv.episode_key).
+    """
+    if isinstance(seed, tuple):
+        (run_seed, worker_id, epoch, episode, training) = seed
+        rng = StreamRNG(run_seed, worker_id)
+        rng.set_stream(epoch, episode, training)
+    else:
+        rng = GLOBAL_RNG
+        rng.seed(seed)
+    _worker_generator.rng = rng
+    states = _worker_generator.generate_states(graph=graph)
+    return states, rng.get_state()
+
+
+class InstancePrefetcher:
+    """
+    Generates the instances of the upcoming episodes in a pool of worker processes.
+    Instances are keyed by the episode seeds of SeedUpdateCallback: every instance is generated
+    from its own seed, so the result does not depend on which worker generated it or when.
+    At most max_prefetch instances are generated ahead of the current episode.
+    """
+
+    def __init__(self, config, num_workers, max_prefetch):
+        self.config = config
+        self.max_prefetch = max_prefetch
+        self.pool = multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=(config,))
+        # (seed, graph) -> pending result, in episode order
+        self.pending = OrderedDict()
+        self.next_key = None
+
+    def _use_graph(self, training):
+        # Use graph during evaluation and also in training if specified
+        return (not training) or self.config.use_comm_graph_in_train
+
+    def _submit(self, key):
+        if key not in self.pending:
+            self.pending[key] = self.pool.apply_async(_generate_states, key)
+
+    def set_episode_seeds(self, seed, upcoming_seeds, training=True):
+        """
+        Sets the seed of the instance used by the next reset and prefetches the instances
+        of the following episodes
+        """
+        graph = self._use_graph(training)
+        self.next_key = (seed, graph)
+        keys = [self.next_key] + [(upcoming_seed, graph) for upcoming_seed in upcoming_seeds[:self.max_prefetch]]
+        # Drop the instances which are not going to be used e.g. after a new epoch started
+        for key in list(self.pending):
+            if key not in keys:
+                del self.pending[key]
+        for key in keys:
+            self._submit(key)
+
+    def pop(self, training=True):
+        """
+        Returns (states, random state) for the next reset, or None if no
+        episode seed was set since the last reset
+        """
+        key, self.next_key = self.next_key, None
+        if key is None or key[1] != self._use_graph(training):
+            return None
+        self._submit(key)
+        return self.pending.pop(key).get()
+
+    def close(self):
+        self.pending.clear()
+        self.pool.terminate()
+        self.pool.join()
@@ -0,0 +1,133 @@
+# Numba compiled versions of the CadesEnv hot paths, used when use_numba is enabled.
+# They update the environment arrays in place and must give the same results as the Python code.
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def place_task(
+    task_idx,
+    node_idx,
+    task_cost,
+    tasks,
+    critical_mask,
+    nodes,
+    communications,
+    task_node,
+    replica_groups,
+    node_groups,
+    node_task_count,
+    comm_pairs,
+):
+    """
+    Places a valid task in a node (see CadesEnv._place_task). The fulfilled (sender, receiver)
+    pairs are written to comm_pairs, receivers of the task first and then its senders.
+    Returns the number of fulfilled receivers and senders and whether all tasks are placed.
+    """
+    num_tasks = tasks.shape[0]
+    num_receivers = 0
+    # receivers of the task which are already placed in the node
+    for other in range(num_tasks):
+        if communications[task_idx, other] == 1 and task_node[other] == node_idx:
+            comm_pairs[num_receivers, 0] = task_idx
+            comm_pairs[num_receivers, 1] = other
+            num_receivers += 1
+    num_senders = 0
+    # senders of the task which are already placed in the node
+    for other in range(num_tasks):
+        if communications[other, task_idx] == 1 and task_node[other] == node_idx:
+            comm_pairs[num_receivers + num_senders, 0] = other
+            comm_pairs[num_receivers + num_senders, 1] = task_idx
+            num_senders += 1
+    # set the communication mask of the fulfilled pairs to zero
+    for i in range(num_receivers + num_senders):
+        communications[comm_pairs[i, 0], comm_pairs[i, 1]] = 0
+    # update states and placement
+    critical_mask[task_idx] = 0
+    tasks[task_idx] = 0
+    nodes[node_idx] -= task_cost
+    task_node[task_idx] = node_idx
+    node_groups[node_idx, replica_groups[task_idx]] = True
+    node_task_count[node_idx] += 1
+    all_placed = True
+    for i in range(num_tasks):
+        if tasks[i] != 0:
+            all_placed = False
+            break
+    return num_receivers, num_senders, all_placed
+
+
+@njit(cache=True)
+def place_task_edges(
+    task_idx,
+    node_idx,
+    task_cost,
+    tasks,
+    critical_mask,
+    nodes,
+    edges,
+    task_node,
+    replica_groups,
+    node_groups,
+    node_task_count,
+    comm_pairs,
+):
+    """
+    Same as place_task, with communications given as a padded (sender, receiver) edge list.
+    Fulfilled edges are set to -1.
+    """
+    num_receivers = 0
+    # receivers of the task which are already placed in the node
+    for e in range(edges.shape[0]):
+        if edges[e, 0] == task_idx and task_node[edges[e, 1]] == node_idx:
+            comm_pairs[num_receivers, 0] = task_idx
+            comm_pairs[num_receivers, 1] = edges[e, 1]
+            num_receivers += 1
+    num_senders = 0
+    # senders of the task which are already placed in the node
+    for e in range(edges.shape[0]):
+        if edges[e, 1] == task_idx and task_node[edges[e, 0]] == node_idx:
+            comm_pairs[num_receivers + num_senders, 0] = edges[e, 0]
+            comm_pairs[num_receivers + num_senders, 1] = task_idx
+            num_senders += 1
+    # keep the same (sorted) order as the Python code
+    comm_pairs[:num_receivers, 1] = np.sort(comm_pairs[:num_receivers, 1])
+    comm_pairs[num_receivers:num_receivers + num_senders, 0] = np.sort(
+        comm_pairs[num_receivers:num_receivers + num_senders, 0]
+    )
+    # remove the fulfilled edges
+    for e in range(edges.shape[0]):
+        if (edges[e, 0] == task_idx and edges[e, 1] >= 0 and task_node[edges[e, 1]] == node_idx) or (
+            edges[e, 1] == task_idx and edges[e, 0] >= 0 and task_node[edges[e, 0]] == node_idx
+        ):
+            edges[e, 0] = -1
+            edges[e, 1] = -1
+    # update states and placement
+    critical_mask[task_idx] = 0
+    tasks[task_idx] = 0
+    nodes[node_idx] -= task_cost
+    task_node[task_idx] = node_idx
+    node_groups[node_idx, replica_groups[task_idx]] = True
+    node_task_count[node_idx] += 1
+    all_placed = True
+    for i in range(tasks.shape[0]):
+        if tasks[i] != 0:
+            all_placed = False
+            break
+    return num_receivers, num_senders, all_placed
+
+
+@njit(cache=True)
+def action_masks(tasks, nodes):
+    """
+    Task mask and node mask for the lowest cost task (see CadesEnv.action_masks)
+    """
+    num_tasks = tasks.shape[0]
+    num_nodes = nodes.shape[0]
+    masks = np.zeros(num_tasks + num_nodes, dtype=np.bool_)
+    for i in range(num_tasks):
+        masks[i] = tasks[i] > 0
+    lowest_cost = tasks[np.argmin(tasks)]
+    for i in range(num_nodes):
+        masks[num_tasks + i] = nodes[i] >= lowest_cost
+    return masks
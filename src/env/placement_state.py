@@ -0,0 +1,154 @@
+from collections.abc import Sequence
+import numpy as np
+
+
+class PlacementState:
+    """
+    Array backed placement of tasks in nodes. Every placement is an O(1) update and
+    replica or node membership queries do not depend on how many tasks are already placed.
+    """
+
+    def __init__(self, max_num_tasks, max_num_nodes, num_groups=0):
+        # node index of each task, -1 if the task is not placed yet
+        self.task_node = np.full(max_num_tasks, -1, dtype=np.int64)
+        # raw critical mask values are used as replica group ids, 0 means non critical
+        self.replica_groups = np.zeros(max_num_tasks, dtype=np.int64)
+        # whether any task of a replica group is placed in a node (nodes x groups)
+        # padded nodes are kept in the arrays so that any node index can be queried
+        self.node_groups = np.zeros((max_num_nodes, num_groups + 1), dtype=bool)
+        # number of tasks placed in each node
+        self.node_task_count = np.zeros(max_num_nodes, dtype=np.int64)
+        # tasks in the order they were placed
+        self.order = []
+        self.num_nodes = 0
+        self.version = 0
+        self.assignment_status = AssignmentStatus(self)
+
+    def reset(self, num_nodes, critical_mask):
+        """
+        Clears the placement for a new episode, reusing the allocated arrays
+        """
+        self.num_nodes = num_nodes
+        np.copyto(self.replica_groups, critical_mask, casting="unsafe")
+        num_groups = self.replica_groups.max(initial=0)
+        if num_groups >= self.node_groups.shape[1]:
+            # More replica groups than expected, grow the table
+            self.node_groups = np.zeros((len(self.node_task_count), num_groups + 1), dtype=bool)
+        else:
+            self.node_groups.fill(False)
+        self.task_node.fill(-1)
+        self.node_task_count.fill(0)
+        self.order.clear()
+        self.version += 1
+
+    def snapshot(self):
+        """
+        Returns an immutable copy of the placement
+        """
+        arrays = []
+        for array in (self.task_node, self.replica_groups, self.node_groups, self.node_task_count):
+            array = array.copy()
+            array.flags.writeable = False
+            arrays.append(array)
+        return (self.num_nodes, *arrays, tuple(self.order))
+
+    def restore(self, snapshot):
+        """
+        Restores a placement returned by snapshot
+        """
+        (self.num_nodes, task_node, replica_groups, node_groups, node_task_count, order) = snapshot
+        self.task_node[...] = task_node
+        self.replica_groups[...] = replica_groups
+        if node_groups.shape != self.node_groups.shape:
+            self.node_groups = node_groups.copy()
+        else:
+            self.node_groups[...] = node_groups
+        self.node_task_count[...] = node_task_count
+        self.order[:] = order
+        self.version += 1
+
+    def place(self, task_index, node_index):
+        """
+        Places a task in a node
+        """
+        self.task_node[task_index] = node_index
+        self.node_groups[node_index, self.replica_groups[task_index]] = True
+        self.node_task_count[node_index] += 1
+        self.order.append(task_index)
+        self.version += 1
+
+    def has_replica(self, task_index, node_index):
+        """
+        Checks if any task of the same replica group as the task is placed in the node
+        """
+        return self.node_groups[node_index, self.replica_groups[task_index]]
+
+    def replica_nodes(self, task_index):
+        """
+        Boolean vector over the nodes which hold a task of the same replica group as the task
+        """
+        return self.node_groups[:, self.replica_groups[task_index]]
+
+    def nodes_holding(self, list_of_tasks):
+        """
+        Boolean vector over the nodes which hold any task of list_of_tasks
+        """
+        nodes = self.task_node[np.asarray(list_of_tasks, dtype=np.int64)]
+        holding = np.zeros(len(self.node_task_count), dtype=bool)
+        holding[nodes[nodes >= 0]] = True
+        return holding
+
+    def tasks_in_node(self, list_of_tasks, node_index):
+        """
+        Gets the tasks from list_of_tasks which are placed in the node
+        """
+        list_of_tasks = np.asarray(list_of_tasks, dtype=np.int64)
+        return list_of_tasks[self.task_node[list_of_tasks] == node_index]
+
+    def empty_nodes_count(self):
+        return int(np.count_nonzero(self.node_task_count[:self.num_nodes] == 0))
+
+    def to_list(self):
+        """
+        Builds the list of tasks placed in each node, in placement order
+        """
+        assignment_status = [[] for _ in range(self.num_nodes)]
+        for task_index in self.order:
+            assignment_status[self.task_node[task_index]].append(task_index)
+        return assignment_status
+
+
+class AssignmentStatus(Sequence):
+    """
+    Read-only list-of-lists view over a PlacementState i.e. the tasks placed in each node.
+    The lists are only built when the view is accessed and after a new placement.
+    """
+
+    def __init__(self, placement_state):
+        self._placement_state = placement_state
+        self._cache = None
+        self._cache_version = -1
+
+    def _get_list(self):
+        if self._cache_version != self._placement_state.version:
+            self._cache = self._placement_state.to_list()
+            self._cache_version = self._placement_state.version
+        return self._cache
+
+    def __getitem__(self, index):
+        return self._get_list()[index]
+
+    def __len__(self):
+        return self._placement_state.num_nodes
+
+    def count(self, value):
+        # Empty nodes are counted without building the lists
+        if isinstance(value, list) and len(value) == 0:
+            return self._placement_state.empty_nodes_count()
+        return self._get_list().count(value)
+
+    def __eq__(self, other):
+        return self._get_list() == list(other)
+
+    def __repr__(self):
+        return repr(self._get_list())
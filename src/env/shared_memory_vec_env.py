@@ -0,0 +1,205 @@
+import multiprocessing
+from types import SimpleNamespace
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+from env.cades_env import CadesEnv
+from utils.rng import GLOBAL_RNG
+from utils.seed_update_callback import generate_seed_name_worker, generate_unique_seed
+
+
+def _shared_array(ctx, shape, dtype):
+    """
+    Numpy array over a shared memory block, returns (block, array). The block is passed to the workers
+    and the array is rebuilt from it with _as_array.
+    """
+    dtype = np.dtype(dtype)
+    block = ctx.RawArray("b", max(int(np.prod(shape)) * dtype.itemsize, 1))
+    return block, _as_array(block, shape, dtype)
+
+
+def _as_array(block, shape, dtype):
+    dtype = np.dtype(dtype)
+    return np.frombuffer(block, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+
+def _worker(remote, parent_remote, config, rank, blocks, specs, use_masks):
+    """
+    Runs a CadesEnv and writes its observations, rewards, dones and action masks in the row `rank`
+    of the shared buffers. Only the commands and the infos go through the pipe.
+    """
+    parent_remote.close()
+    buffers = {name: _as_array(blocks[name], *specs[name]) for name in blocks}
+    observation_keys = list(CadesEnv._observation_space(config).spaces)
+    env = CadesEnv(config, worker_id=rank)
+    episode = 0
+
+    def reset():
+        nonlocal episode
+        # Every episode of every worker has its own seed, whatever the order in which the workers run
+        episode += 1
+        if config.rng_streams:
+            env.seed_episode(0, episode, True)
+        else:
+            GLOBAL_RNG.seed(generate_unique_seed(generate_seed_name_worker(rank, episode)))
+        return env.reset()
+
+    def write(observation):
+        for key in observation_keys:
+            buffers[f"obs_{key}"][rank] = observation[key]
+        if use_masks:
+            buffers["action_masks"][rank] = env.action_masks()
+
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == "step":
+                observation, reward, done, info = env.step(buffers["actions"][rank].copy())
+                if done:
+                    # Same convention as the VecEnvs of stable baselines, the next episode starts right away
+                    info["terminal_observation"] = {key: value.copy() for key, value in observation.items()}
+                    observation = reset()
+                write(observation)
+                buffers["rewards"][rank] = reward
+                buffers["dones"][rank] = done
+                remote.send(info)
+            elif command == "reset":
+                write(reset())
+                remote.send(None)
+            elif command == "action_masks":
+                buffers["action_masks"][rank] = env.action_masks()
+                remote.send(None)
+            elif command == "seed":
+                GLOBAL_RNG.seed(data)
+                remote.send(None)
+            elif command == "get_attr":
+                remote.send(getattr(env, data))
+            elif command == "set_attr":
+                setattr(env, *data)
+                remote.send(None)
+            elif command == "env_method":
+                method_name, args, kwargs = data
+                remote.send(getattr(env, method_name)(*args, **kwargs))
+            elif command == "close":
+                remote.close()
+                break
+            else:
+                raise ValueError(f"Unknown command '{command}'")
+    except KeyboardInterrupt:
+        pass
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Runs n_envs CadesEnv in worker processes. Observations, actions, rewards, dones and action masks are
+    exchanged through buffers allocated once in shared memory, with one row per worker, so a step only
+    sends a command to each worker and receives its info dict. Finished episodes are reset in the worker.
+    Every worker seeds its own episodes (see generate_seed_name_worker), as the global random state of
+    the main process reseeded by SeedUpdateCallback does not reach the workers.
+    When use_masks is set, the action masks are computed by the workers after every step and reset
+    and action_masks reads them from the shared buffer.
+    """
+
+    def __init__(self, config, n_envs, use_masks=False, start_method=None):
+        # Workers are daemon processes which can not start an instance prefetcher pool
+        config = SimpleNamespace(**{**vars(config), "prefetch_workers": 0})
+        self.config = config
+        self.use_masks = use_masks
+        observation_space = CadesEnv._observation_space(config)
+        action_space = CadesEnv._action_space(config)
+        super().__init__(n_envs, observation_space, action_space)
+
+        if start_method is None:
+            # forkserver avoids sharing the threads of the main process, as in SubprocVecEnv
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        ctx = multiprocessing.get_context(start_method)
+
+        specs = {f"obs_{key}": ((n_envs, *space.shape), space.dtype) for key, space in observation_space.spaces.items()}
+        specs["actions"] = ((n_envs, *action_space.shape), np.int64)
+        specs["rewards"] = ((n_envs,), np.float64)
+        specs["dones"] = ((n_envs,), bool)
+        specs["action_masks"] = ((n_envs, CadesEnv._action_mask_size(config)), bool)
+        blocks = {}
+        self.buffers = {}
+        for name, (shape, dtype) in specs.items():
+            blocks[name], self.buffers[name] = _shared_array(ctx, shape, dtype)
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for rank, (work_remote, remote) in enumerate(zip(self.work_remotes, self.remotes)):
+            args = (work_remote, remote, config, rank, blocks, specs, use_masks)
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+        self.waiting = False
+        self.closed = False
+
+    def _get_obs(self):
+        # The buffers are overwritten by the next step, the algorithm keeps its own copy
+        return {key: self.buffers[f"obs_{key}"].copy() for key in self.observation_space.spaces}
+
+    def _broadcast(self, command, data=None, indices=None):
+        remotes = [self.remotes[i] for i in self._get_indices(indices)]
+        for remote in remotes:
+            remote.send((command, data))
+        return [remote.recv() for remote in remotes]
+
+    def reset(self):
+        self._broadcast("reset")
+        return self._get_obs()
+
+    def step_async(self, actions):
+        np.copyto(self.buffers["actions"], np.asarray(actions).reshape(self.buffers["actions"].shape), casting="unsafe")
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        infos = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        return self._get_obs(), self.buffers["rewards"].copy(), self.buffers["dones"].copy(), infos
+
+    def action_masks(self):
+        if not self.use_masks:
+            self._broadcast("action_masks")
+        return self.buffers["action_masks"].copy()
+
+    def seed(self, seed=None):
+        if seed is None:
+            seed = np.random.randint(0, 2**32 - 1)
+        # Global random state of each worker, the episodes are seeded on reset
+        for rank, remote in enumerate(self.remotes):
+            remote.send(("seed", seed + rank))
+        for remote in self.remotes:
+            remote.recv()
+        return [seed + rank for rank in range(self.num_envs)]
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def get_attr(self, attr_name, indices=None):
+        if attr_name == "action_masks":
+            # Bound methods of the workers can not be sent back, masks are read with env_method
+            return [self.action_masks for _ in self._get_indices(indices)]
+        return self._broadcast("get_attr", attr_name, indices)
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._broadcast("set_attr", (attr_name, value), indices)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        if method_name == "action_masks":
+            # Rows of the shared buffer instead of masks pickled by every worker
+            return list(self.action_masks()[list(self._get_indices(indices))])
+        return self._broadcast("env_method", (method_name, method_args, method_kwargs), indices)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
@@ -1,4 +1,6 @@
 import numpy as np
+from env.feasibility import FEASIBILITY_STATS, INFEASIBILITY_REASONS, infeasibility_reasons
+from utils.rng import GLOBAL_RNG
 
 class StatesGenerator():
     """
@@ -18,35 +20,56 @@ class StatesGenerator():
         self.max_num_nodes = config.max_num_nodes
         self.num_critical_tasks = config.number_of_critical_tasks
         self.num_replicas = config.number_of_replicas
+        # random source, the global random state unless the environment sets its own stream
+        self.rng = GLOBAL_RNG
+        # Feasibility check of the generated instances
+        if config.feasibility_check not in ("none", "bounds", "ffd"):
+            raise ValueError(f"Invalid feasibility_check '{config.feasibility_check}', expected none, bounds or ffd")
+        self.feasibility_check = config.feasibility_check
+        self.reject_infeasible = config.reject_infeasible
+        self.max_feasibility_retries = config.max_feasibility_retries
 
     def generate_tasks_and_nodes(self):
         # Tasks
-        num_tasks = np.random.randint(self.min_num_tasks, self.max_num_tasks + 1)
-        tasks = np.random.randint(self.min_task_size, self.max_task_size + 1, size=self.max_num_tasks)
+        num_tasks = self.rng.integers(self.min_num_tasks, self.max_num_tasks + 1)
+        tasks = self.rng.integers(self.min_task_size, self.max_task_size + 1, size=self.max_num_tasks)
         tasks[num_tasks:] = 0  # Zero-padding for invalid tasks
         
         # Nodes
-        num_nodes = np.random.randint(self.min_num_nodes, self.max_num_nodes + 1)
-        nodes = np.random.randint(self.min_node_size, self.max_node_size + 1, size=self.max_num_nodes)
+        num_nodes = self.rng.integers(self.min_num_nodes, self.max_num_nodes + 1)
+        nodes = self.rng.integers(self.min_node_size, self.max_node_size + 1, size=self.max_num_nodes)
         nodes[num_nodes:] = 0  # Zero-padding for invalid nodes
 
         return tasks, num_tasks, nodes, num_nodes
 
-    def generate_tasks_and_nodes_batch(self):
-        assert("Not implemented")
+    def generate_tasks_and_nodes_batch(self, batch_size):
+        """
+        Generates tasks and nodes of batch_size instances at once, stacked along the first axis
+        """
+        # Tasks
+        num_tasks = self.rng.integers(self.min_num_tasks, self.max_num_tasks + 1, size=batch_size)
+        tasks = self.rng.integers(self.min_task_size, self.max_task_size + 1, size=(batch_size, self.max_num_tasks))
+        tasks[np.arange(self.max_num_tasks) >= num_tasks[:, None]] = 0  # Zero-padding for invalid tasks
+
+        # Nodes
+        num_nodes = self.rng.integers(self.min_num_nodes, self.max_num_nodes + 1, size=batch_size)
+        nodes = self.rng.integers(self.min_node_size, self.max_node_size + 1, size=(batch_size, self.max_num_nodes))
+        nodes[np.arange(self.max_num_nodes) >= num_nodes[:, None]] = 0  # Zero-padding for invalid nodes
+
+        return tasks, num_tasks, nodes, num_nodes
 
     def generate_critical_tasks_and_replicas(self, tasks, num_tasks):
         # Get valid tasks where tasks has value > 0
         valid_tasks = np.where(tasks > 0)[0]
-        critical_tasks = np.random.choice(valid_tasks, size=self.num_critical_tasks, replace=False)
+        critical_tasks = self.rng.choice(valid_tasks, size=self.num_critical_tasks, replace=False)
         remaining_tasks = np.setdiff1d(valid_tasks, critical_tasks)
         critical_mask = np.zeros(self.max_num_tasks)
         # For each critical task, add replicas
         for critical_idx, idx in enumerate(critical_tasks):
             # choose candidates for replicas from remaining
             if(len(remaining_tasks) < self.num_replicas):
-                assert("Insufficient candidates for replicas")
-            replicas = np.random.choice(remaining_tasks, size=self.num_replicas, replace=False)
+                raise ValueError("Insufficient candidates for replicas")
+            replicas = self.rng.choice(remaining_tasks, size=self.num_replicas, replace=False)
             # subtract chosen candidates from remaining tasks
             remaining_tasks = np.setdiff1d(remaining_tasks, replicas)
             # assign unique_id in mask to task and its replicas
@@ -54,5 +77,93 @@ class StatesGenerator():
             critical_mask[replicas] = critical_idx + 1
         return critical_mask
 
-    def generate_critical_tasks_and_replicas_batch(self):
-        assert("Not implemented")
+    def generate_critical_tasks_and_replicas_batch(self, tasks, num_tasks):
+        """
+        Batched version of generate_critical_tasks_and_replicas. Picking the critical tasks and then
+        their replicas without replacement is the same as taking the first tasks of a random
+        permutation of the valid tasks, which is done for all instances with a single argsort.
+        """
+        batch_size = len(tasks)
+        valid = tasks > 0
+        num_selected = self.num_critical_tasks * (1 + self.num_replicas)
+        if (valid.sum(axis=1) < num_selected).any():
+            raise ValueError("Insufficient candidates for critical tasks and replicas")
+        # random permutation of valid tasks, invalid tasks are sorted last
+        keys = self.rng.random(tasks.shape)
+        keys[~valid] = np.inf
+        selected = np.argsort(keys, axis=1)[:, :num_selected]
+        # critical tasks come first, then the replicas of each critical task
+        group_ids = np.concatenate((
+            np.arange(1, self.num_critical_tasks + 1),
+            np.repeat(np.arange(1, self.num_critical_tasks + 1), self.num_replicas),
+        ))
+        critical_mask = np.zeros((batch_size, self.max_num_tasks))
+        critical_mask[np.arange(batch_size)[:, None], selected] = group_ids
+        return critical_mask
+
+    def _check_feasibility(self, tasks, critical_mask, nodes, num_nodes, stats):
+        """
+        Checks a batch of instances and updates the feasibility stats, returns whether each instance is feasible
+        """
+        reasons = infeasibility_reasons(
+            tasks, critical_mask, nodes, num_nodes, ffd_probe=self.feasibility_check == "ffd"
+        )
+        stats["checked"] += len(reasons)
+        for index, reason in enumerate(INFEASIBILITY_REASONS):
+            stats[reason] += int(np.count_nonzero(reasons == index + 1))
+        return reasons == 0
+
+    def generate_tasks_nodes_and_replicas(self):
+        """
+        Generates tasks, nodes and critical mask of an instance. With feasibility_check enabled, an infeasible
+        instance is regenerated (up to max_feasibility_retries times) if reject_infeasible is set, otherwise
+        it is flagged. Returns whether the instance is feasible and the feasibility stats of its generation
+        (checks, retries and failures), or None for both if it was not checked.
+        """
+        tasks, num_tasks, nodes, num_nodes = self.generate_tasks_and_nodes()
+        critical_mask = self.generate_critical_tasks_and_replicas(tasks, num_tasks)
+        if self.feasibility_check == "none":
+            return tasks, num_tasks, nodes, num_nodes, critical_mask, None, None
+        stats = dict.fromkeys(FEASIBILITY_STATS, 0)
+        feasible = self._check_feasibility(tasks[None], critical_mask[None], nodes[None], np.array([num_nodes]), stats)[0]
+        retries = 0
+        while self.reject_infeasible and not feasible and retries < self.max_feasibility_retries:
+            retries += 1
+            stats["rejected"] += 1
+            tasks, num_tasks, nodes, num_nodes = self.generate_tasks_and_nodes()
+            critical_mask = self.generate_critical_tasks_and_replicas(tasks, num_tasks)
+            feasible = self._check_feasibility(tasks[None], critical_mask[None], nodes[None], np.array([num_nodes]), stats)[0]
+        if not feasible:
+            stats["flagged"] += 1
+        return tasks, num_tasks, nodes, num_nodes, critical_mask, bool(feasible), stats
+
+    def generate_tasks_nodes_and_replicas_batch(self, batch_size):
+        """
+        Batched version of generate_tasks_nodes_and_replicas, only the infeasible instances are regenerated.
+        The feasibility stats are the totals of the batch.
+        """
+        tasks, num_tasks, nodes, num_nodes = self.generate_tasks_and_nodes_batch(batch_size)
+        critical_mask = self.generate_critical_tasks_and_replicas_batch(tasks, num_tasks)
+        if self.feasibility_check == "none":
+            return tasks, num_tasks, nodes, num_nodes, critical_mask, None, None
+        stats = dict.fromkeys(FEASIBILITY_STATS, 0)
+        feasible = self._check_feasibility(tasks, critical_mask, nodes, num_nodes, stats)
+        retries = 0
+        while self.reject_infeasible and not feasible.all() and retries < self.max_feasibility_retries:
+            retries += 1
+            rejected = np.flatnonzero(~feasible)
+            stats["rejected"] += len(rejected)
+            (
+                tasks[rejected],
+                num_tasks[rejected],
+                nodes[rejected],
+                num_nodes[rejected],
+            ) = self.generate_tasks_and_nodes_batch(len(rejected))
+            critical_mask[rejected] = self.generate_critical_tasks_and_replicas_batch(
+                tasks[rejected], num_tasks[rejected]
+            )
+            feasible[rejected] = self._check_feasibility(
+                tasks[rejected], critical_mask[rejected], nodes[rejected], num_nodes[rejected], stats
+            )
+        stats["flagged"] += int(np.count_nonzero(~feasible))
+        return tasks, num_tasks, nodes, num_nodes, critical_mask, feasible, stats
@@ -0,0 +1,27 @@
+import argparse
+import os
+import time
+from utils.evaluation import EXACT_SOLVER, HEURISTICS, evaluate_all, format_table, parse_corpus_paths, summarize, write_records
+
+if __name__ == "__main__":
+    # Usage: python evaluate.py --models ../experiments/models/p3/trnc_c/*.zip --heuristics ff ffd nf --episodes 100 --output results.csv
+    parser = argparse.ArgumentParser(description="Evaluates models and heuristics on the same instances")
+    parser.add_argument("--models", type=str, nargs="*", default=[], help="Model paths, as p<problem>/<experiment>/<strategy>_<checkpoint>.zip")
+    parser.add_argument("--heuristics", type=str, nargs="*", default=[], choices=list(HEURISTICS) + [EXACT_SOLVER], help="Heuristics evaluated on every pair, bnb is the branch and bound solver")
+    parser.add_argument("--pairs", type=str, nargs="*", default=[], help="Additional (problem, experiment) pairs as p<problem>/<experiment>, e.g. p3/trnc_c")
+    parser.add_argument("--episodes", type=int, default=100, help="Number of instances per pair")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--corpus", type=str, nargs="*", default=[], help="Evaluation corpus of a pair to take its instances from instead of the eval_episode seeds, as p<problem>/<experiment>=<path>")
+    parser.add_argument("--time_budget", type=float, default=10.0, help="Time budget in seconds of the branch and bound solver per instance")
+    parser.add_argument("--local_search_time_budget", type=float, default=0.0, help="Time budget in seconds of the local search improving each successful placement, 0 disables it")
+    parser.add_argument("--deterministic", action="store_true", help="Models take their most likely action instead of sampling it like evaluate_multiple")
+    parser.add_argument("--output", type=str, default="evaluation.csv", help="CSV file of the per-instance records")
+    args = parser.parse_args()
+    if not args.models and not args.pairs:
+        raise ValueError("models and/or pairs argument should be provided")
+
+    start = time.perf_counter()
+    records = evaluate_all(args.models, args.heuristics, args.pairs, args.episodes, args.workers, parse_corpus_paths(args.corpus), args.time_budget, args.local_search_time_budget, args.deterministic)
+    write_records(records, args.output)
+    print(format_table(summarize(records)))
+    print(f"\nWrote {len(records)} records to {args.output} in {time.perf_counter() - start:.1f}s")
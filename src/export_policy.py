@@ -0,0 +1,24 @@
+import argparse
+import os
+from utils.policy_export import export_policy
+from utils.policy_runtime import EXPORT_FORMATS
+
+EXTENSIONS = {"torchscript": ".pt", "onnx": ".onnx"}
+
+if __name__ == "__main__":
+    # Usage: python export_policy.py ../experiments/models/p3/trnc_c/act_mask_best.zip --format torchscript
+    parser = argparse.ArgumentParser(description="Exports trained policies as standalone graphs for PolicyRuntime")
+    parser.add_argument("models", type=str, nargs="+", help="Model paths (PPO, MaskablePPO or RecurrentPPO checkpoints)")
+    parser.add_argument("--format", type=str, default="torchscript", choices=EXPORT_FORMATS, help="Format of the exported graphs")
+    parser.add_argument("--output_dir", type=str, default="", help="Directory of the exported graphs, next to the models if empty")
+    args = parser.parse_args()
+
+    for model_path in args.models:
+        name = os.path.splitext(os.path.basename(model_path))[0] + EXTENSIONS[args.format]
+        model_dir = os.path.dirname(model_path)
+        # Keeps the p<problem>/<experiment> folders of the models
+        output_dir = os.path.join(args.output_dir, *model_dir.split(os.sep)[-2:]) if args.output_dir else model_dir
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = os.path.join(output_dir, name)
+        metadata = export_policy(model_path, output_path, args.format)
+        print(f"Exported {metadata['algorithm']} policy {model_path} to {output_path}")
@@ -0,0 +1,31 @@
+import numpy as np
+from .heuristic import Heuristic
+from .capacity_index import CapacityIndex
+
+class BestFitDecreasingHeuristic(Heuristic):
+    def __init__(self, env):
+        super().__init__(env)
+
+    def _get_sorted_tasks(self, tasks):
+        task_indices = np.where(tasks > 0)[0]
+        task_costs = tasks[task_indices]
+        sorted_indices = task_indices[np.argsort(-task_costs)]  # Sort in decreasing order
+        return sorted_indices.tolist()
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.sorted_tasks = self._get_sorted_tasks(state["tasks"])
+        self.capacity_index = CapacityIndex(state["nodes"][:self.env.placement.num_nodes])
+
+    def predict(self, observation):
+        self.check_reset_state()
+
+        if not self.sorted_tasks:
+            return np.array([None, None]), None
+
+        # Get the next task to assign and the node with the least remaining capacity after placing it
+        current_task_idx = self.sorted_tasks[0]
+        current_node_idx = self.select_node_by_capacity(observation, current_task_idx, self.capacity_index)
+        self.sorted_tasks.pop(0)
+        action = np.array([current_task_idx, current_node_idx])
+        return action, None
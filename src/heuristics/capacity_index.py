@@ -0,0 +1,39 @@
+from bisect import bisect_left, insort
+import numpy as np
+
+
+class CapacityIndex:
+    """
+    Nodes ordered by remaining capacity, kept as a sorted list of (capacity, node) keys.
+    Finding the tightest node which can fit a task is a binary search, and only the nodes whose
+    capacity changed since the last decision are moved in the list.
+    """
+
+    def __init__(self, capacities):
+        self.capacities = np.array(capacities, dtype=np.float64)
+        self.keys = sorted((capacity, node) for node, capacity in enumerate(self.capacities.tolist()))
+
+    def update(self, capacities):
+        """
+        Moves the nodes whose capacity changed, usually only the node of the last placement
+        """
+        capacities = capacities[:len(self.capacities)]
+        for node in np.flatnonzero(capacities != self.capacities).tolist():
+            del self.keys[bisect_left(self.keys, (self.capacities[node], node))]
+            self.capacities[node] = capacities[node]
+            insort(self.keys, (self.capacities[node], node))
+
+    def nodes_fitting(self, cost, largest_first=False):
+        """
+        Nodes which can fit a task of the given cost, from the tightest one (or from the largest one)
+        """
+        start = bisect_left(self.keys, (cost, -1))
+        positions = range(len(self.keys) - 1, start - 1, -1) if largest_first else range(start, len(self.keys))
+        for position in positions:
+            yield self.keys[position][1]
+
+    def largest(self):
+        """
+        Node with the largest remaining capacity
+        """
+        return self.keys[-1][1]
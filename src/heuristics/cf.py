@@ -0,0 +1,177 @@
+from collections import deque
+import numpy as np
+from .heuristic import Heuristic
+
+class ClusterFirstHeuristic(Heuristic):
+    """
+    Groups the communicating tasks into clusters with union-find over the communications, splits the clusters
+    which hold replicas of the same critical task and packs whole clusters, in decreasing size, with best fit.
+    The tasks of a cluster which fits no node are placed one by one, next to their peers when possible.
+    The placement of every task is planned when the episode starts.
+    """
+    def __init__(self, env):
+        super().__init__(env)
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.planned_actions = self._plan(state)
+
+    def predict(self, observation):
+        self.check_reset_state()
+
+        # If all tasks are assigned, return None
+        if not self.planned_actions:
+            return np.array([None, None]), None
+
+        current_task_idx, current_node_idx = self.planned_actions.pop(0)
+        action = np.array([current_task_idx, current_node_idx])
+        return action, None
+
+    def _communication_edges(self, state):
+        """
+        (sender, receiver) pairs of the communications, in sender then receiver order
+        """
+        communications = state["communications"]
+        if self.env.config.comm_edge_list:
+            edges = communications[communications[:, 0] >= 0]
+            return edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+        return np.argwhere(communications == 1)
+
+    def _find_clusters(self, task_indices, edges):
+        """
+        Union-find (union by size, path halving) over the communications, returns the tasks of each cluster
+        """
+        parent = {task: task for task in task_indices}
+        size = {task: 1 for task in task_indices}
+
+        def find(task):
+            while parent[task] != task:
+                parent[task] = parent[parent[task]]
+                task = parent[task]
+            return task
+
+        for sender, receiver in edges:
+            root_a, root_b = find(sender), find(receiver)
+            if root_a == root_b:
+                continue
+            if size[root_a] < size[root_b]:
+                root_a, root_b = root_b, root_a
+            parent[root_b] = root_a
+            size[root_a] += size[root_b]
+
+        clusters = {}
+        for task in task_indices:
+            clusters.setdefault(find(task), []).append(task)
+        return list(clusters.values())
+
+    def _split_replicas(self, cluster, groups, neighbors):
+        """
+        Splits a cluster into parts holding at most one task of each replica group. Tasks are visited
+        in breadth first order and join the part holding most of their already visited peers.
+        """
+        cluster_groups = [groups[task] for task in cluster if groups[task] > 0]
+        if len(cluster_groups) == len(set(cluster_groups)):
+            return [cluster]
+        order = []
+        visited = {cluster[0]}
+        queue = deque([cluster[0]])
+        while queue:
+            task = queue.popleft()
+            order.append(task)
+            for peer in neighbors[task]:
+                if peer not in visited:
+                    visited.add(peer)
+                    queue.append(peer)
+        parts = []
+        parts_groups = []
+        task_part = {}
+        for task in order:
+            peer_counts = [0] * len(parts)
+            for peer in neighbors[task]:
+                if peer in task_part:
+                    peer_counts[task_part[peer]] += 1
+            # Parts by decreasing number of peers, the first one without a replica of the task is joined
+            candidates = sorted(range(len(parts)), key=lambda part: -peer_counts[part])
+            part = next((part for part in candidates if groups[task] == 0 or groups[task] not in parts_groups[part]), None)
+            if part is None:
+                part = len(parts)
+                parts.append([])
+                parts_groups.append(set())
+            parts[part].append(task)
+            parts_groups[part].add(groups[task])
+            task_part[task] = part
+        return parts
+
+    def _plan(self, state):
+        """
+        Returns the (task, node) placements of the episode
+        """
+        tasks = state["tasks"]
+        groups = state["critical_mask"]
+        num_nodes = self.env.placement.num_nodes
+        capacities = state["nodes"][:num_nodes].astype(np.float64)
+        # critical mask values are normalized in the observation, map them to consecutive group ids
+        _, group_ids = np.unique(groups, return_inverse=True)
+        group_ids = np.where(groups > 0, group_ids, 0)
+        node_groups = np.zeros((num_nodes, group_ids.max(initial=0) + 1), dtype=bool)
+
+        task_indices = np.where(tasks > 0)[0].tolist()
+        edges = [
+            (int(sender), int(receiver)) for sender, receiver in self._communication_edges(state)
+            if tasks[sender] > 0 and tasks[receiver] > 0
+        ]
+        neighbors = {task: [] for task in task_indices}
+        for sender, receiver in edges:
+            neighbors[sender].append(receiver)
+            neighbors[receiver].append(sender)
+
+        parts = []
+        for cluster in self._find_clusters(task_indices, edges):
+            parts.extend(self._split_replicas(cluster, group_ids, neighbors))
+        # Largest parts first, as in first fit decreasing
+        parts.sort(key=lambda part: -tasks[part].sum())
+
+        task_node = {}
+        planned_actions = []
+
+        def place(task, node):
+            capacities[node] -= tasks[task]
+            node_groups[node, group_ids[task]] = True
+            task_node[task] = node
+            planned_actions.append((task, node))
+
+        for part in parts:
+            part_groups = group_ids[part]
+            part_groups = part_groups[part_groups > 0]
+            no_replica = ~node_groups[:, part_groups].any(axis=1)
+            candidates = no_replica & (capacities >= tasks[part].sum())
+            if candidates.any():
+                # Best fit for the whole part
+                node = int(np.argmin(np.where(candidates, capacities, np.inf)))
+                for task in part:
+                    place(task, node)
+                continue
+            for task in sorted(part, key=lambda task: -tasks[task]):
+                place(task, self._select_task_node(task, tasks, group_ids, capacities, node_groups, neighbors, task_node))
+        return planned_actions
+
+    def _select_task_node(self, task, tasks, group_ids, capacities, node_groups, neighbors, task_node):
+        """
+        Node of a task of a part which fits no node: the node holding most of its peers, else best fit.
+        The critical and then the overflow checks are skipped when no node passes them.
+        """
+        fits = capacities >= tasks[task]
+        candidates = fits
+        if group_ids[task] > 0:
+            candidates = fits & ~node_groups[:, group_ids[task]]
+        peer_counts = np.zeros(len(capacities))
+        for peer in neighbors[task]:
+            if peer in task_node:
+                peer_counts[task_node[peer]] += 1
+        if (candidates & (peer_counts > 0)).any():
+            return int(np.argmax(np.where(candidates, peer_counts, -1)))
+        for candidates in (candidates, fits):
+            if candidates.any():
+                return int(np.argmin(np.where(candidates, capacities, np.inf)))
+        # All checks skipped, the largest node overflows the least
+        return int(np.argmax(capacities))
@@ -26,11 +26,15 @@ class Heuristic(ABC):
         Precomputes the communication requirements for each task.
         """
         self.communications = {}
+        # senders and receivers of each communicative task, for node_feasibility
+        self.communicating_tasks = {}
         for task_idx in range(len(observation["tasks"])):
             # Get the task senders and receivers
             task_senders = self.env._get_task_senders(task_idx)
             task_receivers = self.env._get_task_receivers(task_idx)
             self.communications[task_idx] = (task_senders, task_receivers)
+            if len(task_senders) > 0 or len(task_receivers) > 0:
+                self.communicating_tasks[task_idx] = np.concatenate((task_senders, task_receivers))
 
     def check_reset_state(self):
        if self.env.info["episode_len"] == 0:
@@ -47,11 +51,7 @@ class Heuristic(ABC):
         """
         Checks if a critical task has already been assigned to the node.
         """
-        critical_mask = self.env.initial_state["critical_mask"]
-        # Get indices of tasks with the same critical mask value
-        replica_indices = np.where(critical_mask == critical_mask[task_index])[0]
-        # Check if any of these tasks are already assigned to the node
-        return np.intersect1d(replica_indices, self.env.assignment_status[node_index]).size > 0
+        return self.env._is_critical_task_duplicated(task_index, node_index)
     
     def _is_node_communication_compatible(self, observation, task_index, node_index):
         """
@@ -81,4 +81,66 @@ class Heuristic(ABC):
                 node_capacity = observation["nodes"][node_index]
                 total_senders_cost = np.sum(observation["tasks"][task_senders])
                 total_receivers_cost = np.sum(observation["tasks"][task_receivers])
-                return node_capacity >= total_senders_cost + total_receivers_cost
\ No newline at end of file
+                return node_capacity >= total_senders_cost + total_receivers_cost
+
+    def node_feasibility(self, observation, task_index):
+        """
+        Boolean vectors over all nodes, computed once per decision, for the checks of placing a task:
+        capacity (the node can fit the task), replica (no replica of a critical task in the node)
+        and communication (see _is_node_communication_compatible).
+        The replica and communication checks are None when they pass for every node.
+        """
+        nodes = observation["nodes"]
+        placement = self.env.placement
+        fits = nodes >= observation["tasks"][task_index]
+        no_replica = None
+        if self._is_task_critical(observation["critical_mask"], task_index):
+            no_replica = ~placement.replica_nodes(task_index)[:len(nodes)]
+        comm_compatible = None
+        communicating_tasks = self.communicating_tasks.get(task_index)
+        if communicating_tasks is not None:
+            # Nodes which already hold a sender or a receiver, or can accommodate all of them
+            total_cost = observation["tasks"][communicating_tasks].sum()
+            comm_compatible = placement.nodes_holding(communicating_tasks)[:len(nodes)] | (nodes >= total_cost)
+        return fits, no_replica, comm_compatible
+
+    def select_node(self, observation, task_index, start_node=0):
+        """
+        Returns the first node from start_node which passes every check. If there is none, the communication
+        check is skipped, then the critical check and finally the overflow check.
+        """
+        fits, no_replica, comm_compatible = self.node_feasibility(observation, task_index)
+        if start_node >= len(fits):
+            # If no node can accommodate the task
+            raise ValueError("No node can accommodate the task")
+        candidates = fits[start_node:]
+        if no_replica is not None:
+            candidates = candidates & no_replica[start_node:]
+        relaxations = [candidates, fits[start_node:]]
+        if comm_compatible is not None:
+            relaxations.insert(0, candidates & comm_compatible[start_node:])
+        for candidates in relaxations:
+            node_idx = int(np.argmax(candidates))
+            if candidates[node_idx]:
+                return start_node + node_idx
+        # All checks skipped, any node is accepted
+        return start_node
+
+    def select_node_by_capacity(self, observation, task_index, capacity_index, largest_first=False):
+        """
+        Returns the tightest node (or the largest one) which can fit the task and passes every check, with the
+        same relaxations as select_node. Nodes are visited in capacity order, so the search stops at the first
+        node passing the checks. When the overflow check is skipped, the largest node is selected.
+        """
+        _, no_replica, comm_compatible = self.node_feasibility(observation, task_index)
+        capacity_index.update(observation["nodes"])
+        cost = observation["tasks"][task_index]
+        candidates = no_replica
+        if comm_compatible is not None:
+            candidates = comm_compatible if no_replica is None else no_replica & comm_compatible
+        for check in (candidates, no_replica, None):
+            for node_idx in capacity_index.nodes_fitting(cost, largest_first):
+                if check is None or check[node_idx]:
+                    return node_idx
+        # All checks skipped
+        return capacity_index.largest()
@@ -0,0 +1,30 @@
+import numpy as np
+from .heuristic import Heuristic
+from .capacity_index import CapacityIndex
+
+class WorstFitHeuristic(Heuristic):
+    def __init__(self, env):
+        super().__init__(env)
+
+    def set_state(self, state):
+        super().set_state(state)
+        tasks = state["tasks"]
+        task_indices = np.where(tasks > 0)[0]
+        self.unassigned_tasks = task_indices.tolist()
+        self.capacity_index = CapacityIndex(state["nodes"][:self.env.placement.num_nodes])
+
+    def predict(self, observation):
+        self.check_reset_state()
+
+        # If all tasks are assigned, return None
+        if not self.unassigned_tasks:
+            return np.array([None, None]), None
+
+        # Get the next task to assign and the node with the most remaining capacity
+        current_task_idx = self.unassigned_tasks[0]
+        current_node_idx = self.select_node_by_capacity(
+            observation, current_task_idx, self.capacity_index, largest_first=True
+        )
+        self.unassigned_tasks.pop(0)
+        action = np.array([current_task_idx, current_node_idx])
+        return action, None
@@ -19,7 +19,7 @@ class MaskablePPOModel(Sb3Model):
         # Initialize the RL model
         model = MaskablePPO(
             "MultiInputPolicy",
-            self.env,
+            self._training_env(use_masks=True),
             verbose=1,
             learning_rate=self.config.lr,
             tensorboard_log=f"../logs/{self.config.experiment_name}/{self.config.run_name}/",
@@ -57,11 +57,15 @@ class MaskablePPOModel(Sb3Model):
             render=False,
             use_masking=True
         )
-        seed_update_callback = SeedUpdateCallback(train=True)
+        seed_update_callback = SeedUpdateCallback(train=True, env=self.env)
         callback_list = CallbackList([metrics_callback, seed_update_callback])
         return callback_list
 
-    def evaluate(self, states=None):
+    def _action_distribution(self, observations, envs, policy_state, episode_starts):
+        action_masks = np.stack([get_action_masks(env) for env in envs])
+        return self.model.policy.get_distribution(observations, action_masks=action_masks), None
+
+    def evaluate(self, states=None, action_rng=None):
 
         episode_reward = 0
         done = False
@@ -69,18 +73,20 @@ class MaskablePPOModel(Sb3Model):
         info = {}
         actions = []
 
+        if action_rng is None:
+            action_rng = self.action_rng
+
         inference_times = []
         while not done:
             inference_times.append(time.time())
-            action_masks = get_action_masks(self.env)
-            action, _states = self.model.predict(obs, action_masks=action_masks)
+            action, _states = self._predict(obs, action_rng)
             inference_times[-1] = time.time() - inference_times[-1]
             obs, reward, done, info = self.env.step(action, training=False)
             episode_reward += reward
             actions.append(action)
 
         # Collecting metrics
-        metrics_results = {metric: info.get(metric, 0) for metric in self.metrics_to_eval}
+        metrics_results = self._placement_metrics(info)
         return {
             "obs": obs,
             "actions": actions,
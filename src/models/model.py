@@ -1,10 +1,51 @@
+import math
+import multiprocessing
+import time
 from abc import ABC, abstractmethod
 from collections import defaultdict
+from types import SimpleNamespace
 import numpy as np
+import torch as th
+from gym import spaces
 from stable_baselines3.common.callbacks import CallbackList
 from utils.metrics_callback import MetricsCallback
-from env.cades_env import TerminationCause
-from utils.seed_update_callback import SeedUpdateCallback
+from env.cades_env import CadesEnv, TerminationCause
+from env.batched_cades_env import BatchedCadesEnv
+from env.feasibility import merge_feasibility_stats
+from env.shared_memory_vec_env import SharedMemoryVecEnv
+from solvers.local_search import LocalSearch
+from utils.policy_quantization import quantize_policy
+from utils.rng import GLOBAL_RNG
+from utils.seed_update_callback import SeedUpdateCallback, generate_seed_name_calibration, generate_seed_name_eval, generate_unique_seed
+
+# Model of the evaluation worker process
+_eval_worker_model = None
+
+
+def _init_eval_worker(model_class, config, parameters, quantization):
+    """
+    Builds the model of an evaluation worker once, with the policy parameters of the main process,
+    quantized like in the main process if it is
+    """
+    global _eval_worker_model
+    # One thread per worker process, the pool provides the parallelism
+    th.set_num_threads(1)
+    # Workers are daemon processes, they neither start rollout workers nor instance prefetchers
+    config = SimpleNamespace(**{**vars(config), "n_envs": 1, "batched_env": False, "prefetch_workers": 0, "eval_workers": 0, "device": "cpu"})
+    _eval_worker_model = model_class(CadesEnv(config), config)
+    _eval_worker_model.model.set_parameters(parameters, exact_match=True, device="cpu")
+    if quantization is not None:
+        _eval_worker_model._apply_quantization(*quantization)
+
+
+def _evaluate_eval_shard(job):
+    episodes, batch_size = job
+    # Feasibility stats of the instances generated for the shard, counted by the main process
+    since = _eval_worker_model.feasibility_stats(training=False)
+    results = _eval_worker_model._evaluate_lockstep(episodes, batch_size)
+    stats = _eval_worker_model.feasibility_stats(training=False)
+    return episodes, results, {key: value - since[key] for key, value in stats.items()}
+
 
 class Sb3Model(ABC):
 
@@ -12,6 +53,12 @@ class Sb3Model(ABC):
         self.metrics_to_eval = ["avg_node_occupancy", "avg_active_node_occupancy", "message_channel_occupancy", "empty_nodes"]
         self.env = env
         self.config = config
+        # Draws the stochastic actions of evaluate, evaluate_multiple uses one generator per episode
+        self.action_rng = np.random.default_rng(config.seed)
+        # Environments of the episodes played in lockstep by evaluate_multiple
+        self.eval_envs = []
+        # Float parameters, quantization mode and calibration observations of a quantized policy
+        self.quantization = None
         if model is not None:
             self.model = model
         else:
@@ -30,13 +77,97 @@ class Sb3Model(ABC):
         pass
 
     @abstractmethod
-    def evaluate(self, obs=None):
+    def evaluate(self, states=None, action_rng=None):
         pass
 
     @abstractmethod
     def model_name(self):
         pass
 
+    def _training_env(self, use_masks=False):
+        """
+        Environment of the rollouts: the n_envs instances of a BatchedCadesEnv stepped in the main process
+        with batched_env, else n_envs worker processes when n_envs is above 1, else the environment of the model.
+        The environment of the model is still used by evaluation and the callbacks.
+        """
+        if self.config.batched_env:
+            return BatchedCadesEnv(self.config, self.config.n_envs)
+        if self.config.n_envs > 1:
+            return SharedMemoryVecEnv(self.config, self.config.n_envs, use_masks=use_masks)
+        return self.env
+
+    def _placement_metrics(self, info, env=None):
+        """
+        Evaluation metrics of an episode. Successful placements are first improved with local search
+        when local_search_time_budget is set.
+        """
+        metrics_results = {metric: info.get(metric, 0) for metric in self.metrics_to_eval}
+        if self.config.local_search_time_budget > 0 and info.get("termination_cause") == str(TerminationCause.SUCCESS):
+            local_search = LocalSearch(self.config, self.config.local_search_time_budget)
+            metrics_results.update(local_search.improve_env(env or self.env)["metrics"])
+        return metrics_results
+
+    def _action_distribution(self, observations, envs, policy_state, episode_starts):
+        """
+        Action distribution of the policy for a batch of observations of the given environments,
+        along with the updated recurrent state (None for feed forward policies)
+        """
+        return self.model.policy.get_distribution(observations), None
+
+    def _select_policy_state(self, policy_state, rows, num_new):
+        """
+        Recurrent state of the given rows of the batch followed by the state of num_new new episodes
+        """
+        return None
+
+    def _sample_actions(self, distribution, action_rngs):
+        """
+        Draws one action per row of a batched (multi) categorical distribution by inverse transform
+        sampling, with the random generator of the episode of the row. The actions of an episode
+        then do not depend on the other episodes of the batch.
+        """
+        if hasattr(distribution, "distributions"):
+            # Maskable multi categorical distribution
+            categoricals = distribution.distributions
+        elif isinstance(distribution.distribution, list):
+            categoricals = distribution.distribution
+        else:
+            categoricals = [distribution.distribution]
+        uniforms = np.array([action_rng.random(len(categoricals)) for action_rng in action_rngs])
+        actions = []
+        for dimension, categorical in enumerate(categoricals):
+            cumulative = np.cumsum(categorical.probs.cpu().numpy().astype(np.float64), axis=1)
+            # First action whose cumulative probability exceeds the draw, masked actions are never drawn
+            thresholds = uniforms[:, dimension] * cumulative[:, -1]
+            drawn = np.count_nonzero(cumulative <= thresholds[:, None], axis=1)
+            actions.append(np.minimum(drawn, cumulative.shape[1] - 1))
+        actions = np.stack(actions, axis=1)
+        if isinstance(self.model.action_space, spaces.Discrete):
+            return actions[:, 0]
+        return actions
+
+    def _predict_batch(self, observations, envs, action_rngs, policy_state=None, episode_starts=None):
+        """
+        Stochastic actions of a batch of observations (one row per environment) with a single policy call.
+        Returns the actions and the recurrent state of the batch.
+        """
+        policy = self.model.policy
+        policy.set_training_mode(False)
+        observations, _ = policy.obs_to_tensor(observations)
+        with th.no_grad():
+            distribution, policy_state = self._action_distribution(observations, envs, policy_state, episode_starts)
+        return self._sample_actions(distribution, action_rngs), policy_state
+
+    def _predict(self, obs, action_rng, policy_state=None, episode_start=True):
+        """
+        Action of an observation of the environment of the model, as a batch of one
+        """
+        observations = {key: value[np.newaxis] for key, value in obs.items()}
+        actions, policy_state = self._predict_batch(
+            observations, [self.env], [action_rng], policy_state, np.asarray(episode_start, dtype=bool).reshape(1)
+        )
+        return actions[0], policy_state
+
     def set_logger(self, logger):
         self.model.set_logger(logger)
 
@@ -50,7 +181,7 @@ class Sb3Model(ABC):
             deterministic=True,
             render=False,
         )
-        seed_update_callback = SeedUpdateCallback(train=True)
+        seed_update_callback = SeedUpdateCallback(train=True, env=self.env)
         callback_list = CallbackList([metrics_callback, seed_update_callback])
         return callback_list
 
@@ -76,8 +207,217 @@ class Sb3Model(ABC):
             if iters % 1000 == 0:
                 self.model.save(f"{save_dir}/models/epoch_{iters}")
 
-    def evaluate_multiple(self, num_episodes=100):
-        
+    def _episode_action_rng(self, episode):
+        return np.random.default_rng(generate_unique_seed(generate_seed_name_eval(episode)))
+
+    def _evaluation_envs(self, num_envs):
+        """
+        Environments of the episodes played in lockstep. Instances are generated in place, corpus
+        instances are read from the stream of the environment of the model to keep the episode order.
+        """
+        config = SimpleNamespace(**{**vars(self.config), "prefetch_workers": 0, "corpus_path": "", "eval_corpus_path": ""})
+        while len(self.eval_envs) < num_envs:
+            self.eval_envs.append(CadesEnv(config, worker_id=self.env.worker_id))
+        return self.eval_envs[:num_envs]
+
+    def _start_lockstep_episode(self, env, episode):
+        """
+        Resets an environment for an evaluation episode with the same seed as SeedUpdateCallback
+        and the sequential evaluation, which reads the evaluation corpus in order from its first instance
+        """
+        if self.config.rng_streams:
+            env.seed_episode(0, episode, False)
+        else:
+            GLOBAL_RNG.seed(generate_unique_seed(generate_seed_name_eval(episode)))
+        corpus = self.env.corpora.get(False)
+        obs = env.reset(corpus[(episode - 1) % len(corpus)] if corpus is not None else None, training=False)
+        return {
+            "env": env,
+            "episode": episode,
+            "obs": obs,
+            # Episodes drawing from the global random state keep their own copy of it between steps
+            "rng_state": env.rng.get_state() if env.rng is GLOBAL_RNG else None,
+            "action_rng": self._episode_action_rng(episode),
+            "episode_start": True,
+            "episode_reward": 0,
+            "actions": [],
+            "inference_time": 0,
+        }
+
+    def _evaluate_lockstep(self, episodes, batch_size):
+        """
+        Plays the given evaluation episodes (numbered from 1) batch_size at a time in lockstep, with one
+        policy call per step on the stacked observations of the active episodes. A finished episode leaves
+        the batch and the next episode takes its place. Every episode has its own environment, random state
+        and action generator so its result is the same as in the sequential evaluation.
+        Returns the results in the order of episodes.
+        """
+        free_envs = list(reversed(self._evaluation_envs(min(batch_size, len(episodes)))))
+        results = {}
+        active = []
+        kept_rows = []
+        policy_state = None
+        pending = list(reversed(episodes))
+        while active or pending:
+            num_new = 0
+            while free_envs and pending:
+                active.append(self._start_lockstep_episode(free_envs.pop(), pending.pop()))
+                num_new += 1
+            policy_state = self._select_policy_state(policy_state, kept_rows, num_new)
+
+            start = time.time()
+            observations = {key: np.stack([episode["obs"][key] for episode in active]) for key in active[0]["obs"]}
+            actions, policy_state = self._predict_batch(
+                observations,
+                [episode["env"] for episode in active],
+                [episode["action_rng"] for episode in active],
+                policy_state,
+                np.array([episode["episode_start"] for episode in active]),
+            )
+            # Every episode of the batch gets its share of the policy call
+            inference_time = (time.time() - start) / len(active)
+
+            kept_rows = []
+            still_active = []
+            for row, episode in enumerate(active):
+                env = episode["env"]
+                if episode["rng_state"] is not None:
+                    env.rng.set_state(episode["rng_state"])
+                obs, reward, done, info = env.step(actions[row], training=False)
+                if episode["rng_state"] is not None:
+                    episode["rng_state"] = env.rng.get_state()
+                episode["obs"] = obs
+                episode["episode_start"] = False
+                episode["episode_reward"] += reward
+                episode["actions"].append(actions[row])
+                episode["inference_time"] += inference_time
+                if not done:
+                    kept_rows.append(row)
+                    still_active.append(episode)
+                    continue
+                results[episode["episode"]] = {
+                    "obs": obs,
+                    "actions": episode["actions"],
+                    "episode_reward": episode["episode_reward"],
+                    "episode_length": info.get("episode_len", 0),
+                    "inference_time": episode["inference_time"],
+                    "termination_cause": info.get("termination_cause", "unknown"),
+                    "metrics": self._placement_metrics(info, env),
+                }
+                free_envs.append(env)
+            active = still_active
+        return [results[episode] for episode in episodes]
+
+    def _evaluate_sharded(self, num_episodes, batch_size, num_workers):
+        """
+        Spreads the evaluation episodes over a pool of worker processes. Every worker builds the policy
+        once and plays shards of episode numbers in lockstep with their usual seeds. The results are
+        streamed back as the shards finish and returned in episode order.
+        """
+        episodes = list(range(1, num_episodes + 1))
+        # A few shards per worker to balance the load
+        shard_size = max(1, math.ceil(num_episodes / (num_workers * 4)))
+        jobs = [(episodes[start:start + shard_size], batch_size) for start in range(0, num_episodes, shard_size)]
+        if self.quantization is not None:
+            # Workers quantize the float policy with the same calibration observations
+            parameters, mode, calibration = self.quantization
+            quantization = (mode, calibration)
+        else:
+            parameters = self.model.get_parameters()
+            quantization = None
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        ctx = multiprocessing.get_context(start_method)
+        results = [None] * num_episodes
+        with ctx.Pool(num_workers, initializer=_init_eval_worker, initargs=(type(self), self.config, parameters, quantization)) as pool:
+            for shard, shard_results, feasibility_stats in pool.imap_unordered(_evaluate_eval_shard, jobs):
+                for episode, episode_results in zip(shard, shard_results):
+                    results[episode - 1] = episode_results
+                self.env.count_feasibility_stats(feasibility_stats, training=False)
+        return results
+
+    def _calibration_observations(self, num_steps):
+        """
+        Observations of num_steps steps of evaluation-like episodes played with the float policy,
+        seeded with calibration_episode_{i} so they do not overlap the evaluation episodes.
+        Returns the stacked observations and the episode starts.
+        """
+        env = self._evaluation_envs(1)[0]
+        action_rng = np.random.default_rng(generate_unique_seed(generate_seed_name_calibration(0)))
+        observations = []
+        episode_starts = []
+        episode = 0
+        done = True
+        while len(observations) < num_steps:
+            if done:
+                episode += 1
+                if self.config.rng_streams:
+                    env.seed_episode(0, episode, True)
+                GLOBAL_RNG.seed(generate_unique_seed(generate_seed_name_calibration(episode)))
+                states = env.generate_states(training=False)
+                # Calibration instances are not counted in the evaluation feasibility stats
+                states.pop("feasibility_stats", None)
+                obs = env.reset(states, training=False)
+                policy_state = None
+            observations.append(obs)
+            episode_starts.append(done)
+            observation = {key: value[np.newaxis] for key, value in obs.items()}
+            actions, policy_state = self._predict_batch(observation, [env], [action_rng], policy_state, np.array([done]))
+            obs, _, done, _ = env.step(actions[0], training=False)
+        observations = {key: np.stack([obs[key] for obs in observations]) for key in observations[0]}
+        return observations, np.array(episode_starts)
+
+    def _calibrate(self, policy, calibration):
+        """
+        Runs the actor and the critic of the policy on the calibration observations
+        """
+        observations, _ = calibration
+        policy(policy.obs_to_tensor(observations)[0], deterministic=True)
+
+    def _apply_quantization(self, mode, calibration):
+        parameters = self.model.get_parameters()
+        quantize_policy(self.model.policy, mode, lambda policy: self._calibrate(policy, calibration))
+        self.quantization = (parameters, mode, calibration)
+
+    def quantize(self, mode=None, calibration_steps=None):
+        """
+        Quantizes the policy to int8 for inference (quantization and calibration_steps by default).
+        Static quantization is calibrated on the observations of calibration_steps steps of rollouts
+        of the float policy. The quantized policy runs on CPU and can not be trained.
+        """
+        if mode is None:
+            mode = self.config.quantization
+        if calibration_steps is None:
+            calibration_steps = self.config.calibration_steps
+        if mode == "none":
+            return
+        if self.quantization is not None:
+            raise ValueError("The policy is already quantized")
+        calibration = self._calibration_observations(calibration_steps) if mode == "static" else None
+        self._apply_quantization(mode, calibration)
+
+    def feasibility_stats(self, training=True):
+        """
+        Feasibility stats of the instances generated for training, summed over the rollout workers,
+        or for evaluation, summed over the environment of the model and the lockstep environments
+        (the evaluation workers report theirs to the environment of the model)
+        """
+        if training:
+            return merge_feasibility_stats([stats[True] for stats in self.model.get_env().get_attr("feasibility_stats")])
+        envs = [self.env] + self.eval_envs
+        return merge_feasibility_stats([env.feasibility_stats[False] for env in envs])
+
+    def evaluate_multiple(self, num_episodes=100, batch_size=None, num_workers=None):
+        """
+        Evaluates the model on num_episodes episodes seeded with eval_episode_{i}. With a batch size above 1
+        (eval_batch_size by default) the episodes are played in lockstep with batched policy calls, and with
+        num_workers above 0 (eval_workers by default) they are spread over worker processes.
+        Either way, every episode gets the same results as one by one.
+        """
+        if batch_size is None:
+            batch_size = self.config.eval_batch_size
+        if num_workers is None:
+            num_workers = self.config.eval_workers
+
         all_inference_times = []
         all_episode_rewards = []
         all_episodes_len = []
@@ -85,13 +425,23 @@ class Sb3Model(ABC):
 
         # Initialize dictionary to store lists of results for each metric
         metrics_accumulator = {metric: [] for metric in self.metrics_to_eval}
-        # Initialize the seed update callback
-        seed_update_callback = SeedUpdateCallback(train=False)
+        # Evaluate the same corpus instances every time, if any
+        self.env.reset_corpus_stream(training=False)
+
+        if num_workers > 0:
+            episodes_results = self._evaluate_sharded(num_episodes, batch_size, num_workers)
+        elif batch_size > 1:
+            episodes_results = self._evaluate_lockstep(list(range(1, num_episodes + 1)), batch_size)
+        else:
+            # Initialize the seed update callback
+            seed_update_callback = SeedUpdateCallback(train=False, env=self.env)
+            episodes_results = []
+            for episode in range(1, num_episodes + 1):
+                # Generate a new seed for the episode
+                seed_update_callback.on_episode_start()
+                episodes_results.append(self.evaluate(action_rng=self._episode_action_rng(episode)))
 
-        for _ in range(num_episodes):
-            # Generate a new seed for the episode
-            seed_update_callback.on_episode_start()
-            results = self.evaluate()
+        for results in episodes_results:
             all_episode_rewards.append(results["episode_reward"])
             all_episodes_len.append(results["episode_length"])
             all_inference_times.append(results["inference_time"])
@@ -15,7 +15,7 @@ class PPOModel(Sb3Model):
         # Initialize the RL model
         model = PPO(
             "MultiInputPolicy",
-            self.env,
+            self._training_env(),
             verbose=1,
             learning_rate=self.config.lr,
             tensorboard_log=f"../logs/{self.config.experiment_name}/{self.config.run_name}/",
@@ -43,7 +43,7 @@ class PPOModel(Sb3Model):
         model_instance = cls(env, config, model=model)
         return model_instance
 
-    def evaluate(self, states=None):
+    def evaluate(self, states=None, action_rng=None):
 
         episode_reward = 0
         done = False
@@ -51,17 +51,20 @@ class PPOModel(Sb3Model):
         info = {}
         actions = []
 
+        if action_rng is None:
+            action_rng = self.action_rng
+
         inference_times = []
         while not done:
             inference_times.append(time.time())
-            action, _states = self.model.predict(obs)
+            action, _states = self._predict(obs, action_rng)
             inference_times[-1] = time.time() - inference_times[-1]
             obs, reward, done, info = self.env.step(action, training=False)
             episode_reward += reward
             actions.append(action)
 
         # Collecting metrics
-        metrics_results = {metric: info.get(metric, 0) for metric in self.metrics_to_eval}
+        metrics_results = self._placement_metrics(info)
         return {
             "obs": obs,
             "actions": actions,
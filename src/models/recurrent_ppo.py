@@ -1,5 +1,7 @@
 import time
+import torch as th
 from sb3_contrib import RecurrentPPO
+from sb3_contrib.common.recurrent.type_aliases import RNNStates
 from .model import Sb3Model
 import numpy as np
 
@@ -15,7 +17,7 @@ class RecurrentPPOModel(Sb3Model):
         # Initialize the RL model
         model = RecurrentPPO(
             "MultiInputLstmPolicy",
-            self.env,
+            self._training_env(),
             verbose=1,
             learning_rate=self.config.lr,
             tensorboard_log=f"../logs/{self.config.experiment_name}/{self.config.run_name}/",
@@ -43,7 +45,31 @@ class RecurrentPPOModel(Sb3Model):
         model_instance = cls(env, config, model=model)
         return model_instance
 
-    def evaluate(self, states=None):
+    def _action_distribution(self, observations, envs, policy_state, episode_starts):
+        policy = self.model.policy
+        if policy_state is None:
+            policy_state = self._select_policy_state(None, [], len(envs))
+        episode_starts = th.tensor(episode_starts, dtype=th.float32, device=policy.device)
+        return policy.get_distribution(observations, lstm_states=policy_state, episode_starts=episode_starts)
+
+    def _select_policy_state(self, policy_state, rows, num_new):
+        # (hidden, cell) LSTM states of shape (layers, batch, hidden size), new episodes start from zeros
+        policy = self.model.policy
+        num_layers, _, hidden_size = policy.lstm_hidden_state_shape
+        zeros = th.zeros((num_layers, num_new, hidden_size), device=policy.device)
+        if policy_state is None:
+            return (zeros, zeros.clone())
+        rows = th.as_tensor(rows, dtype=th.long, device=policy.device)
+        return tuple(th.cat([state[:, rows], zeros], dim=1) for state in policy_state)
+
+    def _calibrate(self, policy, calibration):
+        # The calibration episodes form one sequence, the LSTM states are reset at every episode start
+        observations, episode_starts = calibration
+        lstm_states = self._select_policy_state(None, [], 1)
+        episode_starts = th.tensor(episode_starts, dtype=th.float32, device=policy.device)
+        policy(policy.obs_to_tensor(observations)[0], RNNStates(lstm_states, lstm_states), episode_starts, deterministic=True)
+
+    def evaluate(self, states=None, action_rng=None):
 
         lstm_states = None
         episode_starts = np.array([True], dtype=bool)
@@ -53,10 +79,13 @@ class RecurrentPPOModel(Sb3Model):
         info = {}
         actions = []
 
+        if action_rng is None:
+            action_rng = self.action_rng
+
         inference_times = []
         while not done:
             inference_times.append(time.time())
-            action, lstm_states = self.model.predict(obs, state=lstm_states, episode_start=episode_starts)
+            action, lstm_states = self._predict(obs, action_rng, lstm_states, episode_starts)
             inference_times[-1] = time.time() - inference_times[-1]
             obs, reward, done, info = self.env.step(action, training=False)
             episode_starts = done
@@ -64,7 +93,7 @@ class RecurrentPPOModel(Sb3Model):
             actions.append(action)
 
         # Collecting metrics
-        metrics_results = {metric: info.get(metric, 0) for metric in self.metrics_to_eval}
+        metrics_results = self._placement_metrics(info)
         return {
             "obs": obs,
             "actions": actions,
@@ -0,0 +1,54 @@
+import argparse
+from sb3_contrib import MaskablePPO, RecurrentPPO
+from stable_baselines3 import PPO
+from env.cades_env import CadesEnv, TerminationCause
+from models.maskable_ppo import MaskablePPOModel
+from models.ppo import PPOModel
+from models.recurrent_ppo import RecurrentPPOModel
+from utils.evaluation import format_table, load_pair_config, parse_model_path, write_records
+from utils.policy_export import checkpoint_algorithm
+from utils.policy_quantization import QUANTIZATION_MODES, policy_size
+
+MODEL_CLASSES = {PPO: PPOModel, MaskablePPO: MaskablePPOModel, RecurrentPPO: RecurrentPPOModel}
+
+
+def quantization_report(model_path, modes, num_episodes=100, calibration_steps=2048):
+    """
+    Evaluates a model with evaluate_multiple in float and in each quantization mode, on the same episodes.
+    Returns one row per mode with the success rate, the occupancy metrics, the mean policy latency
+    per decision and the size of the policy.
+    """
+    pair, _ = parse_model_path(model_path)
+    # The checkpoint policy tells the algorithm, the strategy alone does not tell recurrent models apart
+    model_class = MODEL_CLASSES[checkpoint_algorithm(model_path)]
+    config = load_pair_config(pair, device="cpu", quantization="none", calibration_steps=calibration_steps)
+    rows = []
+    for mode in ["none"] + [mode for mode in modes if mode != "none"]:
+        model = model_class.load(model_path, CadesEnv(config), config)
+        model.quantize(mode)
+        result = model.evaluate_multiple(num_episodes)
+        row = {"model": model_path, "quantization": mode, "success": result["termination_cause"][str(TerminationCause.SUCCESS)]}
+        row.update(result["mean_metrics"])
+        # Policy time of an episode over its number of decisions
+        row["latency_us"] = 1e6 * result["mean_inference_time"] / max(result["mean_episode_length"], 1)
+        row["size_kb"] = policy_size(model.model.policy) / 1024
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    # Usage: python quantize_policy.py ../experiments/models/p3/trnc_c/act_mask_best.zip --modes dynamic static --episodes 100
+    parser = argparse.ArgumentParser(description="Compares int8 quantized policies with their float model")
+    parser.add_argument("models", type=str, nargs="+", help="Model paths, as p<problem>/<experiment>/<strategy>_<checkpoint>.zip")
+    parser.add_argument("--modes", type=str, nargs="+", default=["dynamic", "static"], choices=QUANTIZATION_MODES, help="Quantization modes compared with the float model")
+    parser.add_argument("--episodes", type=int, default=100, help="Number of evaluation episodes per model and mode")
+    parser.add_argument("--calibration_steps", type=int, default=2048, help="Number of rollout steps calibrating the static quantization")
+    parser.add_argument("--output", type=str, default="", help="CSV file of the report, not written if empty")
+    args = parser.parse_args()
+
+    rows = []
+    for model_path in args.models:
+        rows.extend(quantization_report(model_path, args.modes, args.episodes, args.calibration_steps))
+    if args.output:
+        write_records(rows, args.output)
+    print(format_table(rows))
@@ -0,0 +1,229 @@
+import time
+from collections import deque
+import numpy as np
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class BranchAndBoundSolver:
+    """
+    Exact placement of an instance by depth first branch and bound. The objective is lexicographic: the number of
+    communications between tasks in different nodes (message channel occupancy), then the number of used nodes.
+    Placements respect node capacities and never put two replicas of a critical task in the same node.
+    - symmetry breaking: among the empty nodes with the same capacity only the first one is tried
+    - memoization: a partial placement is pruned when the same node contents (up to node order) were already
+      reached, after placing the same tasks, with a lower or equal cost
+    - anytime: the search stops after time_budget seconds with the best placement found and a lower bound
+    """
+
+    def __init__(self, config, time_budget=10.0, max_memo_size=1000000):
+        self.config = config
+        self.time_budget = time_budget
+        self.max_memo_size = max_memo_size
+
+    def _communication_edges(self, states):
+        """
+        (sender, receiver) pairs of the communications
+        """
+        communications = states["communications"]
+        if self.config.comm_edge_list:
+            return communications[communications[:, 0] >= 0]
+        return np.argwhere(communications == 1)
+
+    def _task_order(self, tasks, neighbors):
+        """
+        Tasks in breadth first order over the communications, starting each cluster from its largest task
+        and visiting the peers by decreasing cost, so that communicating tasks are placed one after the other
+        """
+        order = []
+        visited = set()
+        for root in sorted(range(len(tasks)), key=lambda task: -tasks[task]):
+            if tasks[root] == 0 or root in visited:
+                continue
+            visited.add(root)
+            queue = deque([root])
+            while queue:
+                task = queue.popleft()
+                order.append(task)
+                for peer in sorted(set(neighbors[task]), key=lambda peer: -tasks[peer]):
+                    if peer not in visited:
+                        visited.add(peer)
+                        queue.append(peer)
+        return order
+
+    def solve(self, states):
+        """
+        Solves the instance of a states dict (see CadesEnv.reset). Returns the best placement found as the
+        (task, node) actions to play, along with its cost, a lower bound of the optimum and the optimality gap.
+        """
+        start_time = time.perf_counter()
+        tasks = [int(cost) for cost in states["tasks"]]
+        groups = [int(group) for group in states["critical_mask"]]
+        capacities = [int(capacity) for capacity in states["nodes"][:states["num_nodes"]]]
+        num_communications = int(states["num_communications"])
+        neighbors = [[] for _ in tasks]
+        for sender, receiver in self._communication_edges(states):
+            if tasks[sender] > 0 and tasks[receiver] > 0:
+                neighbors[sender].append(int(receiver))
+                neighbors[receiver].append(int(sender))
+        self.tasks = tasks
+        self.groups = groups
+        self.neighbors = neighbors
+        self.order = self._task_order(tasks, neighbors)
+        # remaining cost of the tasks from each position of the order
+        self.remaining_cost = np.cumsum([tasks[task] for task in reversed(self.order)])[::-1].tolist() + [0]
+        # every replica of a critical task needs its own node
+        self.min_nodes = max((groups.count(group) for group in set(groups) if group > 0), default=0)
+
+        self.capacities = list(capacities)
+        self.node_groups = [0] * len(capacities)
+        self.node_task_count = [0] * len(capacities)
+        self.task_node = [-1] * len(tasks)
+        self.best_cost = (float("inf"), float("inf"))
+        self.best_task_node = None
+        self.memo = {}
+        self.open_bounds = []
+        self.explored = 0
+        self.deadline = start_time + self.time_budget
+
+        try:
+            self._search(0, 0, 0)
+            optimal = True
+        except SearchTimeout:
+            optimal = False
+
+        if self.best_task_node is None:
+            lower_bound = min(self.open_bounds, default=self.best_cost)
+            result = {"actions": None, "task_node": None, "internode_comms": None, "used_nodes": None, "message_channel_occupancy": None}
+        else:
+            # Unexplored subtrees cannot do better than their bound, explored ones than the best placement
+            lower_bound = min(self.open_bounds + [self.best_cost]) if not optimal else self.best_cost
+            internode_comms, used_nodes = self.best_cost
+            result = {
+                "actions": [(task, self.best_task_node[task]) for task in self.order],
+                "task_node": np.array(self.best_task_node),
+                "internode_comms": internode_comms,
+                "used_nodes": used_nodes,
+                "message_channel_occupancy": self._occupancy(internode_comms, num_communications),
+            }
+        result.update({
+            # Search completed: the placement is optimal, or the instance is infeasible if none was found
+            "optimal": optimal,
+            "lower_bound": lower_bound,
+            "optimality_gap": self._gap(self.best_cost, lower_bound, num_communications),
+            "explored": self.explored,
+            "time": time.perf_counter() - start_time,
+        })
+        return result
+
+    def _occupancy(self, internode_comms, num_communications):
+        # Same as get_evaluate_message_channel_occupancy
+        return round(internode_comms / num_communications * 100, 2) if num_communications > 0 else 0
+
+    def _gap(self, best_cost, lower_bound, num_communications):
+        """
+        Gap between the best placement and the lower bound, in message channel occupancy points
+        """
+        if self.best_task_node is None:
+            return None
+        return self._occupancy(best_cost[0] - lower_bound[0], num_communications)
+
+    def _lower_bound(self, depth, internode_comms, used_nodes):
+        """
+        Cost which no completion of the partial placement can beat: the communications which are already
+        between different nodes or can no longer be in the same node, and the nodes needed by the remaining cost
+        """
+        tasks, groups, capacities, node_groups, task_node = self.tasks, self.groups, self.capacities, self.node_groups, self.task_node
+        forced = 0
+        for task in self.order[depth:]:
+            for peer in self.neighbors[task]:
+                node = task_node[peer]
+                if node >= 0:
+                    # Placed peer in a node which can not take the task anymore
+                    if capacities[node] < tasks[task] or (groups[task] > 0 and node_groups[node] >> groups[task] & 1):
+                        forced += 1
+                elif groups[task] > 0 and groups[task] == groups[peer] and task < peer:
+                    # Replicas of the same critical task are always in different nodes
+                    forced += 1
+        free_capacity = 0
+        largest_empty = 0
+        for node, capacity in enumerate(capacities):
+            if self.node_task_count[node] > 0:
+                free_capacity += capacity
+            else:
+                largest_empty = max(largest_empty, capacity)
+        extra_cost = self.remaining_cost[depth] - free_capacity
+        extra_nodes = 0
+        if extra_cost > 0:
+            if largest_empty == 0:
+                return (float("inf"), float("inf"))
+            extra_nodes = -(-extra_cost // largest_empty)
+        return (internode_comms + forced, max(used_nodes + extra_nodes, self.min_nodes))
+
+    def _memo_key(self, depth):
+        """
+        Node contents which determine the completions of a partial placement: remaining capacity, replica
+        groups and the placed tasks which still communicate with unplaced tasks, up to node order
+        """
+        frontier = [0] * len(self.capacities)
+        for task in self.order[:depth]:
+            if any(self.task_node[peer] < 0 for peer in self.neighbors[task]):
+                frontier[self.task_node[task]] |= 1 << task
+        used = [count > 0 for count in self.node_task_count]
+        return (depth, tuple(sorted(zip(self.capacities, self.node_groups, frontier, used))))
+
+    def _search(self, depth, internode_comms, used_nodes):
+        self.explored += 1
+        if self.explored % 1024 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if depth == len(self.order):
+            if (internode_comms, used_nodes) < self.best_cost:
+                self.best_cost = (internode_comms, used_nodes)
+                self.best_task_node = list(self.task_node)
+            return
+        bound = self._lower_bound(depth, internode_comms, used_nodes)
+        if bound >= self.best_cost:
+            return
+        if len(self.memo) < self.max_memo_size:
+            key = self._memo_key(depth)
+            if self.memo.get(key, (float("inf"), float("inf"))) <= (internode_comms, used_nodes):
+                # Dominated by an explored placement of the same tasks
+                return
+            self.memo[key] = (internode_comms, used_nodes)
+
+        task = self.order[depth]
+        cost, group = self.tasks[task], self.groups[task]
+        group_bit = 1 << group if group > 0 else 0
+        children = []
+        empty_capacities = set()
+        for node, capacity in enumerate(self.capacities):
+            if capacity < cost or self.node_groups[node] & group_bit:
+                continue
+            if self.node_task_count[node] == 0:
+                # Empty nodes with the same capacity are interchangeable
+                if capacity in empty_capacities:
+                    continue
+                empty_capacities.add(capacity)
+            new_comms = sum(1 for peer in self.neighbors[task] if self.task_node[peer] >= 0 and self.task_node[peer] != node)
+            new_node = int(self.node_task_count[node] == 0)
+            children.append((new_comms, new_node, capacity, node))
+        # Fewest new internode communications, then no new node, then tightest fit
+        children.sort()
+        for new_comms, new_node, _, node in children:
+            self.capacities[node] -= cost
+            self.node_groups[node] |= group_bit
+            self.node_task_count[node] += 1
+            self.task_node[task] = node
+            try:
+                self._search(depth + 1, internode_comms + new_comms, used_nodes + new_node)
+            except SearchTimeout:
+                # The rest of the subtree is unexplored and can not beat its bound
+                self.open_bounds.append(bound)
+                raise
+            finally:
+                self.capacities[node] += cost
+                self.node_groups[node] &= ~group_bit
+                self.node_task_count[node] -= 1
+                self.task_node[task] = -1
@@ -0,0 +1,178 @@
+import time
+import numpy as np
+from utils.eval_metrics import (
+    get_avg_node_occupancy,
+    get_avg_active_node_occupancy,
+    get_evaluate_message_channel_occupancy,
+    get_empty_nodes_percentage,
+)
+
+
+class LocalSearch:
+    """
+    Improves a valid placement by moving a task to another node or swapping the nodes of two tasks,
+    while keeping node capacities and replica exclusion. A change is applied when it lowers, in order,
+    the number of communications between nodes or the number of used nodes, or else raises the sum of
+    squared node loads, which gathers tasks in fewer nodes. Every change is evaluated in O(1) from the load,
+    the task count and the replica groups of each node and the number of peers of each task in each node.
+    """
+
+    def __init__(self, config, time_budget):
+        self.config = config
+        self.time_budget = time_budget
+
+    def _communication_edges(self, states):
+        """
+        (sender, receiver) pairs of the communications
+        """
+        communications = states["communications"]
+        if self.config.comm_edge_list:
+            return communications[communications[:, 0] >= 0]
+        return np.argwhere(communications == 1)
+
+    def improve(self, states, task_node):
+        """
+        Improves the placement task_node (node of each task of the states dict, -1 for padded tasks)
+        until no change improves it or the time budget is spent. Returns the improved placement.
+        """
+        start_time = time.perf_counter()
+        deadline = start_time + self.time_budget
+        costs = [int(cost) for cost in states["tasks"]]
+        groups = [int(group) for group in states["critical_mask"]]
+        capacities = [int(capacity) for capacity in states["nodes"][:states["num_nodes"]]]
+        num_nodes = len(capacities)
+        task_node = [int(node) for node in task_node]
+        tasks = [task for task, cost in enumerate(costs) if cost > 0]
+
+        loads = [0] * num_nodes
+        counts = [0] * num_nodes
+        # number of tasks of each replica group in each node
+        node_groups = [{} for _ in range(num_nodes)]
+        for task in tasks:
+            node = task_node[task]
+            loads[node] += costs[task]
+            counts[node] += 1
+            node_groups[node][groups[task]] = node_groups[node].get(groups[task], 0) + 1
+        # communications between each pair of tasks and number of peers of each task in each node
+        pair_comms = {}
+        peers = {task: [] for task in tasks}
+        peers_in_node = {task: [0] * num_nodes for task in tasks}
+        for sender, receiver in self._communication_edges(states):
+            sender, receiver = int(sender), int(receiver)
+            if costs[sender] == 0 or costs[receiver] == 0:
+                continue
+            for task, peer in ((sender, receiver), (receiver, sender)):
+                peers[task].append(peer)
+                peers_in_node[task][task_node[peer]] += 1
+                pair_comms[task, peer] = pair_comms.get((task, peer), 0) + 1
+        num_comms = sum(len(peers[task]) for task in tasks) // 2
+        internode_comms = num_comms - sum(peers_in_node[task][task_node[task]] for task in tasks) // 2
+
+        def has_replica(node, group):
+            # whether the node holds a replica of the group, non critical tasks have no replicas
+            return group > 0 and node_groups[node].get(group, 0) > 0
+
+        def move(task, source, target):
+            cost = costs[task]
+            loads[source] -= cost
+            loads[target] += cost
+            counts[source] -= 1
+            counts[target] += 1
+            node_groups[source][groups[task]] -= 1
+            node_groups[target][groups[task]] = node_groups[target].get(groups[task], 0) + 1
+            task_node[task] = target
+            for peer in peers[task]:
+                peers_in_node[peer][source] -= 1
+                peers_in_node[peer][target] += 1
+
+        moves = 0
+        swaps = 0
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            # Move neighbourhood
+            for task in tasks:
+                source = task_node[task]
+                cost = costs[task]
+                for target in range(num_nodes):
+                    if target == source or loads[target] + cost > capacities[target] or has_replica(target, groups[task]):
+                        continue
+                    comms_delta = peers_in_node[task][source] - peers_in_node[task][target]
+                    used_delta = (counts[target] == 0) - (counts[source] == 1)
+                    # change of the sum of squared loads, negated as it should increase
+                    spread_delta = -2 * cost * (loads[target] - loads[source] + cost)
+                    if (comms_delta, used_delta, spread_delta) < (0, 0, 0):
+                        move(task, source, target)
+                        internode_comms += comms_delta
+                        moves += 1
+                        improved = True
+                        source = target
+            # Swap neighbourhood
+            for index, task in enumerate(tasks):
+                for other in tasks[index + 1:]:
+                    source, target = task_node[task], task_node[other]
+                    if source == target or groups[task] == groups[other] > 0:
+                        continue
+                    cost_delta = costs[other] - costs[task]
+                    if loads[source] + cost_delta > capacities[source] or loads[target] - cost_delta > capacities[target]:
+                        continue
+                    # replicas of the same group are never swapped, so the leaving task is not a replica
+                    if has_replica(target, groups[task]) or has_replica(source, groups[other]):
+                        continue
+                    comms_delta = (
+                        peers_in_node[task][source] - peers_in_node[task][target]
+                        + peers_in_node[other][target] - peers_in_node[other][source]
+                        # communications between the two tasks stay between nodes
+                        + 2 * pair_comms.get((task, other), 0)
+                    )
+                    spread_delta = -2 * cost_delta * (loads[source] - loads[target] + cost_delta)
+                    if (comms_delta, spread_delta) < (0, 0):
+                        move(task, source, target)
+                        move(other, target, source)
+                        internode_comms += comms_delta
+                        swaps += 1
+                        improved = True
+            if time.perf_counter() > deadline:
+                break
+
+        return {
+            "task_node": np.array(task_node),
+            "internode_comms": internode_comms,
+            "intranode_comms": num_comms - internode_comms,
+            "used_nodes": sum(count > 0 for count in counts),
+            "moves": moves,
+            "swaps": swaps,
+            "time": time.perf_counter() - start_time,
+        }
+
+    def improve_env(self, env):
+        """
+        Improves the placement of the current episode of a CadesEnv and returns the result of improve
+        along with the evaluation metrics and assignment status of the improved placement.
+        The environment itself is not modified.
+        """
+        placement = env.placement
+        states = {
+            # costs and capacities in their original units
+            "tasks": np.rint(env.initial_state["tasks"] * env.norm_factor).astype(np.int64),
+            "nodes": np.rint(env.initial_state["nodes"] * env.norm_factor).astype(np.int64),
+            "critical_mask": placement.replica_groups,
+            "num_nodes": placement.num_nodes,
+            "communications": env.initial_state["communications"],
+        }
+        result = self.improve(states, placement.task_node)
+        placed = states["tasks"] > 0
+        used_capacities = np.bincount(result["task_node"][placed], weights=states["tasks"][placed], minlength=len(states["nodes"]))
+        assignment_status = [[] for _ in range(placement.num_nodes)]
+        for task in np.flatnonzero(placed):
+            assignment_status[result["task_node"][task]].append(int(task))
+        # same as CadesEnv._update_eval_metrics, the communications count of the generator is the total
+        total_comms = env.env_stats["comms_len"]
+        result["assignment_status"] = assignment_status
+        result["metrics"] = {
+            "avg_node_occupancy": get_avg_node_occupancy(states["nodes"], states["nodes"] - used_capacities),
+            "avg_active_node_occupancy": get_avg_active_node_occupancy(states["nodes"], states["nodes"] - used_capacities),
+            "message_channel_occupancy": get_evaluate_message_channel_occupancy(total_comms, result["intranode_comms"]),
+            "empty_nodes": get_empty_nodes_percentage(assignment_status),
+        }
+        return result
@@ -0,0 +1,286 @@
+import csv
+import multiprocessing
+import os
+import re
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+import numpy as np
+from env.cades_env import CadesEnv, TerminationCause
+from env.instance_corpus import InstanceCorpus
+from heuristics.bf import BestFitHeuristic
+from heuristics.bfd import BestFitDecreasingHeuristic
+from heuristics.cf import ClusterFirstHeuristic
+from heuristics.ff import FirstFitHeuristic
+from heuristics.ffd import FirstFitDecreasingHeuristic
+from heuristics.nf import NextFitHeuristic
+from heuristics.wf import WorstFitHeuristic
+from solvers.branch_and_bound import BranchAndBoundSolver
+from solvers.local_search import LocalSearch
+from utils.config import load_yaml_config, merge_configs, dict_to_namespace
+from utils.eval_metrics import get_avg_active_node_occupancy, get_avg_node_occupancy
+from utils.rng import GLOBAL_RNG
+from utils.seed_update_callback import generate_seed_name_eval, generate_unique_seed
+
+CONFIGS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "configs")
+
+HEURISTICS = {
+    "ff": FirstFitHeuristic,
+    "ffd": FirstFitDecreasingHeuristic,
+    "nf": NextFitHeuristic,
+    "bf": BestFitHeuristic,
+    "wf": WorstFitHeuristic,
+    "bfd": BestFitDecreasingHeuristic,
+    "cf": ClusterFirstHeuristic,
+}
+
+# Branch and bound solver, evaluated like the heuristics
+EXACT_SOLVER = "bnb"
+
+METRICS = ["avg_node_occupancy", "avg_active_node_occupancy", "message_channel_occupancy", "empty_nodes"]
+
+# Models are stored as experiments/models/p<problem>/<experiment>/<strategy>_<checkpoint>.zip
+MODEL_PATH_PATTERN = re.compile(r"p(\d+)[/\\](\w+)[/\\]([a-z_]+?)_(best|\d+)\.zip$")
+
+
+def load_pair_config(pair, **overrides):
+    """
+    Config of a (problem, experiment) pair written as p<problem>/<experiment> e.g. p3/trnc_c
+    """
+    problem, experiment = pair.split("/")
+    config_files = ["default.yaml", f"problem_{problem[1:]}.yaml", f"experiment_{experiment}.yaml"]
+    configs = [load_yaml_config(os.path.join(CONFIGS_DIR, config_file)) for config_file in config_files]
+    return dict_to_namespace(merge_configs(*configs, overrides))
+
+
+def parse_model_path(model_path):
+    """
+    Returns the (problem, experiment) pair and the strategy of a model from its path
+    """
+    match = MODEL_PATH_PATTERN.search(model_path)
+    if match is None:
+        raise ValueError(f"Model path '{model_path}' does not match p<problem>/<experiment>/<strategy>_<checkpoint>.zip")
+    problem, experiment, strategy, _ = match.groups()
+    return f"p{problem}/{experiment}", strategy
+
+
+def parse_corpus_paths(corpora):
+    """
+    Returns the evaluation corpus of each pair from arguments written as p<problem>/<experiment>=<path>
+    """
+    corpus_paths = {}
+    for corpus in corpora:
+        pair, separator, path = corpus.partition("=")
+        if not separator or not path:
+            raise ValueError(f"Corpus '{corpus}' does not match p<problem>/<experiment>=<path>")
+        corpus_paths[pair] = path
+    return corpus_paths
+
+
+def generate_instances(pair, num_episodes, corpus_path=None):
+    """
+    Instances shared by every agent of a pair: the instances of evaluate_multiple i.e. generated with
+    the eval_episode_{i} seeds, or the first instances of the evaluation corpus of the pair
+    """
+    env = CadesEnv(load_pair_config(pair))
+    if corpus_path:
+        corpus = InstanceCorpus(corpus_path)
+        # The corpus must have been built for the problem of the pair
+        corpus.check_shapes(env.observation_space)
+        return [{key: np.array(value) for key, value in corpus[i].items()} for i in range(num_episodes)]
+    instances = []
+    for episode in range(1, num_episodes + 1):
+        GLOBAL_RNG.seed(generate_unique_seed(generate_seed_name_eval(episode)))
+        instances.append(env.generate_states(training=False))
+    return instances
+
+
+def _load_agent(agent, env, deterministic=False):
+    """
+    Returns the predict(obs, action_rng) function of a heuristic name or a model path. Models sample their
+    actions from the action generator of the episode like evaluate_multiple, or take the most likely
+    action when deterministic is set.
+    """
+    if agent in HEURISTICS:
+        heuristic = HEURISTICS[agent](env)
+        return lambda obs, action_rng: heuristic.predict(obs)[0]
+    import torch
+    # One thread per worker process, the pool provides the parallelism
+    torch.set_num_threads(1)
+    from models.maskable_ppo import MaskablePPOModel
+    from models.ppo import PPOModel
+    _, strategy = parse_model_path(agent)
+    model_class = MaskablePPOModel if strategy == "act_mask" else PPOModel
+    config = SimpleNamespace(**{**vars(env.config), "device": "cpu"})
+    model = model_class.load(agent, env, config)
+    if not deterministic:
+        return lambda obs, action_rng: model._predict(obs, action_rng)[0]
+    if strategy == "act_mask":
+        return lambda obs, action_rng: model.model.predict(obs, action_masks=env.action_masks(), deterministic=True)[0]
+    return lambda obs, action_rng: model.model.predict(obs, deterministic=True)[0]
+
+
+def evaluate_exact(pair, instances, time_budget):
+    """
+    Solves every instance with the branch and bound solver and returns one record per instance.
+    Placements are scored from the solver result rather than played in the environment.
+    """
+    config = load_pair_config(pair)
+    solver = BranchAndBoundSolver(config, time_budget)
+    records = []
+    for episode, states in enumerate(instances, start=1):
+        result = solver.solve(states)
+        record = {
+            "pair": pair,
+            "agent": EXACT_SOLVER,
+            "episode": episode,
+            "termination_cause": None,
+            "episode_reward": None,
+            "episode_length": 0,
+            "latency": result["time"],
+        }
+        record.update({metric: None for metric in METRICS})
+        if result["actions"] is not None:
+            placed = states["tasks"] > 0
+            used_capacities = np.bincount(result["task_node"][placed], weights=states["tasks"][placed], minlength=len(states["nodes"]))
+            nodes_tasks = np.bincount(result["task_node"][placed], minlength=states["num_nodes"])[:states["num_nodes"]]
+            record.update({
+                "termination_cause": str(TerminationCause.SUCCESS),
+                "episode_length": int(placed.sum()),
+                "avg_node_occupancy": get_avg_node_occupancy(states["nodes"], states["nodes"] - used_capacities),
+                "avg_active_node_occupancy": get_avg_active_node_occupancy(states["nodes"], states["nodes"] - used_capacities),
+                "message_channel_occupancy": result["message_channel_occupancy"],
+                "empty_nodes": round(np.count_nonzero(nodes_tasks == 0) / states["num_nodes"] * 100, 2),
+            })
+        record["optimality_gap"] = result["optimality_gap"]
+        records.append(record)
+    return records
+
+
+def evaluate_agent(pair, agent, instances, time_budget=10.0, local_search_time_budget=0.0, deterministic=False):
+    """
+    Plays every instance with an agent and returns one record per instance. Models sample their actions
+    with the eval_episode_{i} action generators of evaluate_multiple unless deterministic is set.
+    Successful placements are improved with local search when local_search_time_budget is set.
+    """
+    if agent == EXACT_SOLVER:
+        return evaluate_exact(pair, instances, time_budget)
+    env = CadesEnv(load_pair_config(pair))
+    predict = _load_agent(agent, env, deterministic)
+    local_search = LocalSearch(env.config, local_search_time_budget) if local_search_time_budget > 0 else None
+    records = []
+    for episode, states in enumerate(instances, start=1):
+        # Same random state as evaluate_multiple, used by the environment for invalid actions
+        GLOBAL_RNG.seed(generate_unique_seed(generate_seed_name_eval(episode)))
+        # Same action generator as the episode of evaluate_multiple
+        action_rng = np.random.default_rng(generate_unique_seed(generate_seed_name_eval(episode)))
+        obs = env.reset(states, training=False)
+        done = False
+        info = {}
+        episode_reward = 0
+        latency = 0
+        while not done:
+            start = time.perf_counter()
+            action = predict(obs, action_rng)
+            latency += time.perf_counter() - start
+            if action[0] is None:
+                # Heuristic has no task left to place
+                break
+            obs, reward, done, info = env.step(action, training=False)
+            episode_reward += reward
+        record = {
+            "pair": pair,
+            "agent": agent,
+            "episode": episode,
+            "termination_cause": info.get("termination_cause"),
+            "episode_reward": episode_reward,
+            "episode_length": info.get("episode_len", 0),
+            "latency": latency,
+        }
+        record.update({metric: info.get(metric) for metric in METRICS})
+        if local_search is not None and record["termination_cause"] == str(TerminationCause.SUCCESS):
+            result = local_search.improve_env(env)
+            record.update(result["metrics"])
+            record["latency"] += result["time"]
+        record["optimality_gap"] = None
+        records.append(record)
+    return records
+
+
+def _evaluate_job(job):
+    return evaluate_agent(*job)
+
+
+def evaluate_all(models, heuristics, pairs, num_episodes, num_workers, corpus_paths=None, time_budget=10.0, local_search_time_budget=0.0, deterministic=False):
+    """
+    Evaluates the models and the heuristics on the same instances of each (problem, experiment) pair,
+    one job per (pair, agent) spread over a process pool. Returns the records of every episode.
+    corpus_paths maps a pair to its evaluation corpus, the other pairs use the eval_episode_{i} seeds.
+    Models sample their actions like evaluate_multiple, or take the most likely action when deterministic is set.
+    time_budget is the time in seconds of the branch and bound solver per instance and
+    local_search_time_budget the time of the local search improving each successful placement.
+    """
+    agents_per_pair = defaultdict(list)
+    for model_path in models:
+        pair, _ = parse_model_path(model_path)
+        agents_per_pair[pair].append(model_path)
+    for pair in pairs:
+        # Pairs without models are evaluated with the heuristics only
+        agents_per_pair.setdefault(pair, [])
+    corpus_paths = corpus_paths or {}
+    for pair in corpus_paths:
+        if pair not in agents_per_pair:
+            raise ValueError(f"Corpus given for pair '{pair}', which is not evaluated")
+    jobs = []
+    for pair, agents in agents_per_pair.items():
+        instances = generate_instances(pair, num_episodes, corpus_paths.get(pair))
+        jobs.extend((pair, agent, instances, time_budget, local_search_time_budget, deterministic) for agent in list(heuristics) + agents)
+    records = []
+    with multiprocessing.Pool(num_workers) as pool:
+        for job_records in pool.imap_unordered(_evaluate_job, jobs):
+            records.extend(job_records)
+    records.sort(key=lambda record: (record["pair"], record["agent"], record["episode"]))
+    return records
+
+
+def write_records(records, path):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(records[0].keys()))
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def summarize(records):
+    """
+    Aggregates the records per (pair, agent) like evaluate_multiple: percentage of each termination cause,
+    metrics averaged over successful episodes, and mean latency per episode
+    """
+    groups = defaultdict(list)
+    for record in records:
+        groups[(record["pair"], record["agent"])].append(record)
+    rows = []
+    for (pair, agent), group in groups.items():
+        row = {"pair": pair, "agent": agent}
+        for cause in TerminationCause:
+            row[str(cause)] = 100 * np.mean([record["termination_cause"] == str(cause) for record in group])
+        successful = [record for record in group if record["termination_cause"] == str(TerminationCause.SUCCESS)]
+        for metric in METRICS:
+            row[metric] = np.mean([record[metric] for record in successful]) if successful else 0
+        row["latency_ms"] = 1000 * np.mean([record["latency"] for record in group])
+        rows.append(row)
+    return rows
+
+
+def format_table(rows):
+    """
+    Markdown table of the summary rows
+    """
+    columns = list(rows[0].keys())
+    lines = [
+        "| " + " | ".join(columns) + " |",
+        "|" + "|".join("---" for _ in columns) + "|",
+    ]
+    for row in rows:
+        values = [f"{value:.2f}" if isinstance(value, float) else str(value) for value in row.values()]
+        lines.append("| " + " | ".join(values) + " |")
+    return "\n".join(lines)
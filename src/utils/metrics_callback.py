@@ -1,6 +1,7 @@
 import numpy as np
 from sb3_contrib.common.maskable.callbacks import MaskableEvalCallback
 from env.cades_env import TerminationCause
+from env.feasibility import merge_feasibility_stats
 
 class MetricsCallback(MaskableEvalCallback):
     def __init__(self, *args, use_masking: bool = False, **kwargs):
@@ -49,6 +50,15 @@ class MetricsCallback(MaskableEvalCallback):
             print(f"Avg Active Node Occupancy: {mean_avg_active_node_occupancy:.2f}%")
             print(f"Avg Message Channel Occupancy: {mean_message_channel_occupancy:.2f}%")
             print(f"Avg Empty Nodes: {mean_empty_nodes:.2f}%")
+        # Log the feasibility stats of the generated instances since the start of the run, the training
+        # instances are summed over the rollout workers
+        if self.eval_env.get_attr("config")[0].feasibility_check != "none":
+            training_stats = merge_feasibility_stats([stats[True] for stats in self.training_env.get_attr("feasibility_stats")])
+            evaluation_stats = merge_feasibility_stats([stats[False] for stats in self.eval_env.get_attr("feasibility_stats")])
+            for key, value in training_stats.items():
+                self.logger.record(f"generation/{key}", value)
+            for key, value in evaluation_stats.items():
+                self.logger.record(f"generation/eval_{key}", value)
         # Clear the metrics for the next evaluation cycle
         self.avg_node_occupancy.clear()
         self.avg_active_node_occupancy.clear()
@@ -58,8 +68,13 @@ class MetricsCallback(MaskableEvalCallback):
 
     def _on_step(self) -> np.bool:
         """Called at each step."""
+        evaluation = self.eval_freq > 0 and self.n_calls % self.eval_freq == 0
+        if evaluation:
+            since = dict(self.eval_env.get_attr("feasibility_stats")[0][True])
         super()._on_step()
-        if self.eval_freq > 0 and self.n_calls % self.eval_freq == 0:
+        if evaluation:
+            # The evaluation episodes are reset in training mode, their instances are counted as evaluation
+            self.eval_env.env_method("move_feasibility_stats", since)
             self._store_metrics()
             self.episode_count = 0
         return True
\ No newline at end of file
@@ -59,10 +59,16 @@ class MLFlowManager:
                 self.model.train(save_path)
             # Evaluate Model
             if self.config.inference is True:
+                # Int8 policy when quantization is set
+                self.model.quantize()
                 result = self.model.evaluate_multiple()
                 expanded_result = expand_result_dict(result)
                 self.log_metrics(expanded_result)
                 print(expanded_result)
+            # Log the feasibility stats of the instances generated during the run, for training and evaluation
+            if self.config.feasibility_check != "none":
+                self.log_metrics({f"generation/{key}": value for key, value in self.model.feasibility_stats(training=True).items()})
+                self.log_metrics({f"generation/eval_{key}": value for key, value in self.model.feasibility_stats(training=False).items()})
 
 class MLflowOutputFormat(KVWriter):
     """
@@ -0,0 +1,144 @@
+import json
+import numpy as np
+import torch as th
+from torch import nn
+from gym import spaces
+from stable_baselines3 import PPO
+from stable_baselines3.common.policies import BaseModel
+from stable_baselines3.common.save_util import load_from_zip_file
+from sb3_contrib import MaskablePPO, RecurrentPPO
+from sb3_contrib.common.maskable.policies import MaskableActorCriticPolicy
+from sb3_contrib.common.recurrent.policies import RecurrentActorCriticPolicy
+from utils.policy_runtime import EXPORT_FORMATS, OBSERVATION_KEYS, metadata_path
+
+
+def _features(policy, tasks, critical_mask, nodes, communications):
+    """
+    Features of one raw observation, as a batch of one, with the observation preprocessing
+    (float conversion) and the features extractor of the actor
+    """
+    observations = {
+        key: value.unsqueeze(0) for key, value in zip(OBSERVATION_KEYS, (tasks, critical_mask, nodes, communications))
+    }
+    return BaseModel.extract_features(policy, observations, policy.pi_features_extractor)
+
+
+class ActorGraph(nn.Module):
+    """
+    Observation to action logits of a feed forward policy
+    """
+
+    def __init__(self, policy):
+        super().__init__()
+        self.policy = policy
+
+    def forward(self, tasks, critical_mask, nodes, communications):
+        features = _features(self.policy, tasks, critical_mask, nodes, communications)
+        return self.policy.action_net(self.policy.mlp_extractor.forward_actor(features))[0]
+
+
+class RecurrentActorGraph(nn.Module):
+    """
+    Observation and LSTM states to action logits and next LSTM states of a recurrent policy,
+    for one step of one episode. The states are reset by the runtime at the start of an episode.
+    """
+
+    def __init__(self, policy):
+        super().__init__()
+        self.policy = policy
+
+    def forward(self, tasks, critical_mask, nodes, communications, hidden, cell):
+        policy = self.policy
+        features = _features(policy, tasks, critical_mask, nodes, communications)
+        # (sequence length, batch, features) with a sequence of one step
+        latent, (hidden, cell) = policy.lstm_actor(features.unsqueeze(0), (hidden, cell))
+        logits = policy.action_net(policy.mlp_extractor.forward_actor(latent.squeeze(0)))
+        return logits[0], hidden, cell
+
+
+# Only the policy is needed, not the training schedules
+NO_SCHEDULES = {"lr_schedule": 0.0, "clip_range": 0.0}
+
+
+def checkpoint_algorithm(model_path):
+    """
+    Algorithm of the policy of a checkpoint (PPO, MaskablePPO or RecurrentPPO)
+    """
+    data, _, _ = load_from_zip_file(model_path, device="cpu", custom_objects=NO_SCHEDULES)
+    if issubclass(data["policy_class"], RecurrentActorCriticPolicy):
+        return RecurrentPPO
+    if issubclass(data["policy_class"], MaskableActorCriticPolicy):
+        return MaskablePPO
+    return PPO
+
+
+def load_algorithm(model_path):
+    """
+    Loads a checkpoint with the algorithm of its policy
+    """
+    return checkpoint_algorithm(model_path).load(model_path, device="cpu", custom_objects=NO_SCHEDULES)
+
+
+def export_policy(model_path, output_path, export_format="torchscript"):
+    """
+    Exports the actor of a checkpoint as a standalone graph (TorchScript or ONNX) taking the raw observations,
+    along with the metadata needed by PolicyRuntime. Returns the metadata.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{export_format}', expected one of {EXPORT_FORMATS}")
+    if export_format == "onnx":
+        # onnx is an optional dependency, only needed by the ONNX exporter of torch
+        try:
+            import onnx  # noqa: F401
+        except ImportError as e:
+            raise ImportError("onnx is required to export ONNX policies (pip install onnx)") from e
+    algorithm = load_algorithm(model_path)
+    policy = algorithm.policy
+    policy.set_training_mode(False)
+    observation_space = policy.observation_space
+    action_space = policy.action_space
+    recurrent = isinstance(policy, RecurrentActorCriticPolicy)
+
+    # One observation, with the dtypes of the environment observations
+    example_inputs = [
+        th.from_numpy(np.zeros(observation_space[key].shape, dtype=observation_space[key].dtype))
+        for key in OBSERVATION_KEYS
+    ]
+    input_names = list(OBSERVATION_KEYS)
+    output_names = ["logits"]
+    if recurrent:
+        graph = RecurrentActorGraph(policy)
+        lstm_state_shape = list(policy.lstm_hidden_state_shape)
+        example_inputs += [th.zeros(lstm_state_shape), th.zeros(lstm_state_shape)]
+        input_names += ["hidden", "cell"]
+        output_names += ["next_hidden", "next_cell"]
+    else:
+        graph = ActorGraph(policy)
+        lstm_state_shape = None
+    graph.eval()
+
+    with th.no_grad():
+        if export_format == "torchscript":
+            traced = th.jit.trace(graph, tuple(example_inputs))
+            th.jit.save(traced, output_path)
+        else:
+            th.onnx.export(graph, tuple(example_inputs), output_path, input_names=input_names, output_names=output_names)
+
+    if isinstance(action_space, spaces.Discrete):
+        # Flat action space, one action per (task, node) pair
+        action_dims = [int(action_space.n)]
+    else:
+        action_dims = [int(n) for n in action_space.nvec]
+    metadata = {
+        "format": export_format,
+        "algorithm": type(algorithm).__name__,
+        "inputs": {key: {"shape": list(observation_space[key].shape), "dtype": str(observation_space[key].dtype)} for key in OBSERVATION_KEYS},
+        "action_dims": action_dims,
+        "flat_action_space": isinstance(action_space, spaces.Discrete),
+        "max_num_nodes": int(observation_space["nodes"].shape[0]),
+        "masked": isinstance(policy, MaskableActorCriticPolicy),
+        "lstm_state_shape": lstm_state_shape,
+    }
+    with open(metadata_path(output_path), "w") as file:
+        json.dump(metadata, file, indent=2)
+    return metadata
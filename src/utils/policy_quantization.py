@@ -0,0 +1,73 @@
+import io
+import torch as th
+from torch import nn
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+QUANTIZATION_MODES = ["none", "dynamic", "static"]
+
+# Quantized kernels of the host CPU, in order of preference
+QUANTIZED_ENGINES = ["x86", "fbgemm", "qnnpack"]
+
+
+def _quantized_engine():
+    engine = next((engine for engine in QUANTIZED_ENGINES if engine in th.backends.quantized.supported_engines), None)
+    if engine is None:
+        raise ValueError(f"No quantized engine available, expected one of {QUANTIZED_ENGINES}")
+    th.backends.quantized.engine = engine
+    return engine
+
+
+def _static_heads(policy):
+    """
+    (parent, name) of the feed forward networks of an actor critic policy: the actor and critic
+    networks of the MLP extractor, the action net and the value net. Empty networks are skipped.
+    """
+    heads = [(policy.mlp_extractor, "policy_net"), (policy.mlp_extractor, "value_net"), (policy, "action_net"), (policy, "value_net")]
+    return [(parent, name) for parent, name in heads if any(isinstance(module, nn.Linear) for module in getattr(parent, name).modules())]
+
+
+def quantize_policy(policy, mode, calibrate=None):
+    """
+    Replaces the float layers of an actor critic policy by int8 layers, in place.
+    dynamic quantizes the weights of the linear and LSTM layers and the activations on the fly.
+    static also fixes the int8 ranges of the activations of the feed forward networks, observed while
+    calibrate(policy) runs the policy on calibration observations. LSTMs have no static int8 kernels
+    and are dynamically quantized in both modes. The features extractor only flattens the observations
+    and stays in float.
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode '{mode}', expected one of {QUANTIZATION_MODES}")
+    if mode == "none":
+        return policy
+    if policy.device.type != "cpu":
+        raise ValueError(f"Quantized policies run on CPU only, the policy is on {policy.device}")
+    engine = _quantized_engine()
+    policy.set_training_mode(False)
+    if mode == "static":
+        if calibrate is None:
+            raise ValueError("Static quantization needs a calibration function")
+        heads = _static_heads(policy)
+        qconfig_mapping = get_default_qconfig_mapping(engine)
+        for parent, name in heads:
+            module = getattr(parent, name)
+            in_features = next(layer for layer in module.modules() if isinstance(layer, nn.Linear)).in_features
+            # Observers record the ranges of the activations during calibration
+            setattr(parent, name, prepare_fx(module, qconfig_mapping, (th.zeros(1, in_features),)))
+        with th.no_grad():
+            calibrate(policy)
+        for parent, name in heads:
+            setattr(parent, name, convert_fx(getattr(parent, name)))
+    layers = {nn.Linear, nn.LSTM} if mode == "dynamic" else {nn.LSTM}
+    quantize_dynamic(policy, layers, dtype=th.qint8, inplace=True)
+    return policy
+
+
+def policy_size(policy):
+    """
+    Size in bytes of the serialized parameters of a policy
+    """
+    buffer = io.BytesIO()
+    th.save(policy.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
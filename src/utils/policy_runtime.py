@@ -0,0 +1,94 @@
+import json
+import numpy as np
+
+EXPORT_FORMATS = ["torchscript", "onnx"]
+
+# Inputs of the exported graphs, in this order
+OBSERVATION_KEYS = ["tasks", "critical_mask", "nodes", "communications"]
+
+# Logit of masked actions, as in the maskable distributions of sb3_contrib
+MASKED_LOGIT = -1e8
+
+
+def metadata_path(graph_path):
+    return f"{graph_path}.json"
+
+
+class PolicyRuntime:
+    """
+    Runs a policy exported with export_policy.py on CPU, without stable baselines or gym. Observations are
+    the dicts of CadesEnv and actions are the [task, node] of CadesEnv.step, chosen deterministically.
+    Action masks (CadesEnv.action_masks) are applied when given. Recurrent policies keep their LSTM states
+    between calls, reset must be called at the start of every episode.
+    TorchScript graphs run with torch and ONNX graphs with onnxruntime.
+    """
+
+    def __init__(self, path):
+        with open(metadata_path(path), "r") as file:
+            self.metadata = json.load(file)
+        self.recurrent = self.metadata["lstm_state_shape"] is not None
+        # Logits of each action dimension
+        bounds = np.cumsum([0] + self.metadata["action_dims"]).tolist()
+        self.dimensions = [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+        if self.metadata["format"] == "onnx":
+            # onnxruntime is an optional dependency, only needed for ONNX graphs
+            try:
+                import onnxruntime
+            except ImportError as e:
+                raise ImportError("onnxruntime is required to run ONNX policies (pip install onnxruntime)") from e
+            self.session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+            self._run = self._run_onnx
+        else:
+            import torch
+            self.torch = torch
+            self.graph = torch.jit.freeze(torch.jit.load(path, map_location="cpu").eval())
+            self._run = self._run_torchscript
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the LSTM states of a recurrent policy for a new episode
+        """
+        if not self.recurrent:
+            self.lstm_states = ()
+        elif self.metadata["format"] == "onnx":
+            self.lstm_states = tuple(np.zeros(self.metadata["lstm_state_shape"], dtype=np.float32) for _ in range(2))
+        else:
+            self.lstm_states = tuple(self.torch.zeros(self.metadata["lstm_state_shape"]) for _ in range(2))
+
+    def _run_torchscript(self, obs):
+        inputs = [self.torch.from_numpy(np.asarray(obs[key])) for key in OBSERVATION_KEYS]
+        with self.torch.inference_mode():
+            outputs = self.graph(*inputs, *self.lstm_states)
+        if self.recurrent:
+            logits, *self.lstm_states = outputs
+        else:
+            logits = outputs
+        return logits.numpy()
+
+    def _run_onnx(self, obs):
+        inputs = {key: np.asarray(obs[key]) for key in OBSERVATION_KEYS}
+        if self.recurrent:
+            inputs["hidden"], inputs["cell"] = self.lstm_states
+        logits, *lstm_states = self.session.run(None, inputs)
+        if self.recurrent:
+            self.lstm_states = tuple(lstm_states)
+        return logits
+
+    def logits(self, obs):
+        """
+        Action logits of an observation, the logits of every action dimension one after the other
+        """
+        return self._run(obs)
+
+    def predict(self, obs, action_masks=None):
+        """
+        Returns the [task, node] action of an observation
+        """
+        logits = self._run(obs)
+        if action_masks is not None:
+            logits[~action_masks] = MASKED_LOGIT
+        actions = [int(logits[dimension].argmax()) for dimension in self.dimensions]
+        if self.metadata["flat_action_space"]:
+            return np.array(divmod(actions[0], self.metadata["max_num_nodes"]))
+        return np.array(actions)
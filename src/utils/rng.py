@@ -0,0 +1,85 @@
+import random
+import numpy as np
+
+
+class GlobalRNG:
+    """
+    Draws from the global random and np.random states, which SeedUpdateCallback reseeds
+    at the start of every episode
+    """
+
+    def integers(self, low, high=None, size=None):
+        return np.random.randint(low, high, size)
+
+    def choice(self, a, size=None, replace=True):
+        return np.random.choice(a, size=size, replace=replace)
+
+    def random(self, size=None):
+        return np.random.random(size)
+
+    def pick(self, seq):
+        """
+        Random element of a sequence
+        """
+        return random.choice(seq)
+
+    def seed(self, seed):
+        random.seed(seed)
+        np.random.seed(seed)
+
+    def get_state(self):
+        return random.getstate(), np.random.get_state()
+
+    def set_state(self, state):
+        random.setstate(state[0])
+        np.random.set_state(state[1])
+
+
+class StreamRNG:
+    """
+    Counter-based random source of a worker. The Philox key is (run seed, worker id) and every
+    (epoch, episode) of the worker starts its own stream at counter [0, episode, epoch, train],
+    so switching to the stream of an episode is O(1) and does not depend on the previous episodes
+    or on the other workers.
+    """
+
+    def __init__(self, seed, worker_id=0):
+        self.key = np.array([seed, worker_id], dtype=np.uint64)
+        self.generator = np.random.Generator(np.random.Philox(key=self.key))
+
+    def set_stream(self, epoch, episode, train=True):
+        self.generator.bit_generator.state = {
+            "bit_generator": "Philox",
+            "state": {
+                "counter": np.array([0, episode, epoch, int(train)], dtype=np.uint64),
+                "key": self.key,
+            },
+            "buffer": np.zeros(4, dtype=np.uint64),
+            "buffer_pos": 4,
+            "has_uint32": 0,
+            "uinteger": 0,
+        }
+
+    def integers(self, low, high=None, size=None):
+        return self.generator.integers(low, high, size)
+
+    def choice(self, a, size=None, replace=True):
+        return self.generator.choice(a, size=size, replace=replace)
+
+    def random(self, size=None):
+        return self.generator.random(size)
+
+    def pick(self, seq):
+        """
+        Random element of a sequence
+        """
+        return seq[self.generator.integers(len(seq))]
+
+    def get_state(self):
+        return self.generator.bit_generator.state
+
+    def set_state(self, state):
+        self.generator.bit_generator.state = state
+
+
+GLOBAL_RNG = GlobalRNG()
@@ -6,9 +6,15 @@ import random
 def generate_seed_name_train(epoch, episode):
     return f"train_epoch_{epoch}_episode_{episode}"
 
+def generate_seed_name_worker(worker, episode):
+    return f"train_worker_{worker}_episode_{episode}"
+
 def generate_seed_name_eval(episode):
     return f"eval_episode_{episode}"
 
+def generate_seed_name_calibration(episode):
+    return f"calibration_episode_{episode}"
+
 def generate_unique_seed(unique_string):
     # Create a unique string identifier for the epoch and iteration
     unique_identifier = unique_string
@@ -24,11 +30,13 @@ def generate_unique_seed(unique_string):
 
 class SeedUpdateCallback(BaseCallback):
 
-    def __init__(self, train, verbose=0):
+    def __init__(self, train, verbose=0, env=None):
         super(SeedUpdateCallback, self).__init__(verbose)
         self.is_train = train
         self.epoch = 0
         self.episode = 0
+        # CadesEnv whose random stream and instance prefetcher follow the episodes
+        self.env = env
 
     def _on_training_start(self) -> None:
         """
@@ -57,17 +65,29 @@ class SeedUpdateCallback(BaseCallback):
 
         return True  # Return True to continue training
 
+    def generate_seed_name(self, episode):
+        if self.is_train:
+            return generate_seed_name_train(self.epoch, episode)
+        return generate_seed_name_eval(episode)
+
     def initialize_episode_seed(self):
         """
         Initialize the seed for the episode
         """
-        if self.is_train:
-            seed_name = generate_seed_name_train(self.epoch, self.episode)
+        if self.env is not None and self.env.config.rng_streams:
+            # The environment has its own counter-based stream, only its position changes
+            seed = self.env.seed_episode(self.epoch, self.episode, self.is_train)
+            upcoming_seed = lambda episode: self.env.episode_key(self.epoch, episode, self.is_train)
         else:
-            seed_name = generate_seed_name_eval(self.episode)
-        seed = generate_unique_seed(seed_name)
-        # print("Seed:", seed_name, seed)
-        random.seed(seed)
-        np.random.seed(seed)
+            seed_name = self.generate_seed_name(self.episode)
+            seed = generate_unique_seed(seed_name)
+            # print("Seed:", seed_name, seed)
+            random.seed(seed)
+            np.random.seed(seed)
+            upcoming_seed = lambda episode: generate_unique_seed(self.generate_seed_name(episode))
+        prefetcher = self.env.instance_prefetcher if self.env is not None else None
+        if prefetcher is not None:
+            upcoming_seeds = [upcoming_seed(self.episode + i) for i in range(1, prefetcher.max_prefetch + 1)]
+            prefetcher.set_episode_seeds(seed, upcoming_seeds, training=self.is_train)
         # if 'env' in self.locals:
         #     self.locals['env'].seed(seed)
\ No newline at end of file